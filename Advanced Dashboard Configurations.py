@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
-import json
 import yaml
 from typing import Optional, Dict, Any, List
 
+from column_profiler import DatasetProfile, build_profile, infer_lookml_type
+from flat_file_loader import (DEFAULT_LOAD_MODE, JSON_EXTENSIONS, LOAD_MODES, YAML_EXTENSIONS, FlatFile, file_digest,
+                              read_csv, read_json, read_yaml)
+
 # ----------------------- Constants -----------------------
-SUPPORTED_FILE_TYPES = ["csv", "json", "yaml", "yml"]
+SUPPORTED_FILE_TYPES = ["csv", "json", "ndjson", "jsonl", "yaml", "yml"]
 DEFAULT_MODEL_NAME = "your_model_name"
 DEFAULT_VIEW_NAME = "your_view_name"
 DEFAULT_DASHBOARD_TITLE = "My Advanced LookML Dashboard"
@@ -18,37 +21,19 @@ def to_lookml_name(name: str) -> str:
 
 def infer_data_type(column: pd.Series) -> str:
     """Infers the data type of a Pandas Series."""
-    if pd.api.types.is_datetime64_any_dtype(column):
-        return "date"
-    elif pd.api.types.is_numeric_dtype(column):
-        return "number"
-    else:
-        return "string"
+    return infer_lookml_type(column.dtype)
 
 # ----------------------- File Loading -----------------------
-def load_flat_file(uploaded_file) -> Optional[pd.DataFrame]:
-    """Loads a flat file (CSV, JSON, YAML) into a Pandas DataFrame."""
+def load_flat_file(uploaded_file, mode: str = DEFAULT_LOAD_MODE, record_path: Optional[str] = None,
+                   max_depth: Optional[int] = None) -> Optional[FlatFile]:
+    """Loads a flat file (CSV, JSON/NDJSON, YAML) as a FlatFile, sampled or streamed according to mode."""
     try:
         if uploaded_file.name.endswith(".csv"):
-            return pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith(".json"):
-            raw_json = json.load(uploaded_file)
-            if isinstance(raw_json, list):
-                return pd.json_normalize(raw_json)
-            elif isinstance(raw_json, dict):
-                return pd.json_normalize(raw_json)
-            else:
-                st.error("⚠️ Unsupported JSON format: Must be a list or dictionary.")
-                return None
-        elif uploaded_file.name.endswith((".yaml", ".yml")):
-            raw_yaml = yaml.safe_load(uploaded_file)
-            if isinstance(raw_yaml, list):
-                return pd.json_normalize(raw_yaml)
-            elif isinstance(raw_yaml, dict):
-                return pd.json_normalize(raw_yaml)
-            else:
-                st.error("⚠️ Unsupported YAML format: Must be a list or dictionary.")
-                return None
+            return read_csv(uploaded_file, uploaded_file.name, mode=mode)
+        elif uploaded_file.name.endswith(JSON_EXTENSIONS):
+            return read_json(uploaded_file, uploaded_file.name, mode=mode, record_path=record_path, max_depth=max_depth)
+        elif uploaded_file.name.endswith(YAML_EXTENSIONS):
+            return read_yaml(uploaded_file, uploaded_file.name, mode=mode, record_path=record_path, max_depth=max_depth)
         else:
             st.error(f"❌ Unsupported file format. Please upload one of: {', '.join(SUPPORTED_FILE_TYPES)}")
             return None
@@ -56,6 +41,48 @@ def load_flat_file(uploaded_file) -> Optional[pd.DataFrame]:
         st.error(f"⚠️ Error loading file: {e}")
         return None
 
+def cached_flat_file(uploaded_file, mode: str, record_path: Optional[str] = None,
+                     max_depth: Optional[int] = None) -> Optional[FlatFile]:
+    """Returns the loaded file from session state, reading it again only when the upload or options change."""
+    key = (uploaded_file.file_id, mode, record_path, max_depth)
+    if st.session_state.get("flat_file_key") != key:
+        flat_file = load_flat_file(uploaded_file, mode, record_path, max_depth)
+        if flat_file is None:
+            return None
+        st.session_state["flat_file"] = flat_file
+        st.session_state["flat_file_key"] = key
+    return st.session_state["flat_file"]
+
+def record_load_options(uploaded_file) -> Dict[str, Any]:
+    """Sidebar inputs for JSON/YAML record selection and flattening depth; empty for CSV."""
+    if not uploaded_file.name.endswith(JSON_EXTENSIONS + YAML_EXTENSIONS):
+        return {}
+    record_path = st.sidebar.text_input("Record Path", help="Dotted path to the list of records, e.g. data.results")
+    max_depth = st.sidebar.number_input("Nesting Depth", min_value=-1, value=-1, step=1,
+                                        help="Levels of nested objects to flatten into columns; -1 flattens all, "
+                                             "0 keeps nested objects as values")
+    return {"record_path": record_path or None, "max_depth": None if max_depth < 0 else int(max_depth)}
+
+def uploaded_file_hash(uploaded_file) -> str:
+    """Content hash of the upload, computed once per upload and kept in session state."""
+    hashes = st.session_state.setdefault("file_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = file_digest(uploaded_file)
+    return hashes[uploaded_file.file_id]
+
+@st.cache_data(show_spinner="Profiling columns...", max_entries=16)
+def cached_profile(file_key: tuple, _data: pd.DataFrame, _stats=None) -> DatasetProfile:
+    """Column profile for one file and set of load options; reruns and re-uploads of the same file reuse it."""
+    return build_profile(_data, _stats)
+
+def render_file_profile(flat_file: FlatFile):
+    """Shows how much of the file was read and the running column statistics."""
+    if not flat_file.complete:
+        st.caption(f"Previewing and configuring from the first {len(flat_file.sample):,} rows; "
+                   f"column statistics cover {flat_file.rows_profiled:,} rows.")
+    with st.expander("📈 Column Statistics"):
+        st.dataframe(flat_file.stats_frame(), hide_index=True)
+
 # ----------------------- LookML Generation -----------------------
 def generate_lookml_view(df: pd.DataFrame, view_name: str, column_config: Dict[str, Dict[str, str]], sql_table_name: str) -> str:
     """Generates a LookML view from a DataFrame and user-defined column configurations."""
@@ -145,11 +172,17 @@ def main():
     )
 
     if uploaded_file is not None:
-        data = load_flat_file(uploaded_file)
-
-        if data is not None:
+        load_mode = st.sidebar.selectbox("File Loading", list(LOAD_MODES), format_func=LOAD_MODES.get)
+        record_options = record_load_options(uploaded_file)
+        flat_file = cached_flat_file(uploaded_file, load_mode, **record_options)
+
+        if flat_file is not None:
+            data = flat_file.sample
+            file_key = (uploaded_file_hash(uploaded_file), load_mode, *record_options.values())
+            profile = cached_profile(file_key, data, flat_file.stats)
             st.write("### 🗂️ Data Preview")
             st.dataframe(data.head())
+            render_file_profile(flat_file)
 
             # View Configuration
             st.write("### ⚙️ View Configuration")
@@ -159,11 +192,10 @@ def main():
             column_config = {}
             st.write("### 🔧 Configure Columns:")
 
-            for col in data.columns:
+            for col in profile.names:
                 st.markdown(f"**Column:** `{col}`")
-                col_dtype = data[col].dtype
                 default_field_type = "dimension"
-                default_data_type = infer_data_type(data[col])
+                default_data_type = profile[col].data_type
 
                 field_type = st.selectbox(
                     f"Field type for `{col}`",
@@ -210,21 +242,20 @@ def main():
 
             tile_configs = []
 
+            # Field options are the same for every tile, so they are built once from the profile
+            date_fields = profile.date_fields
+            all_dimensions = profile.names + [f"{col}_year" for col in date_fields] + [f"{col}_month" for col in date_fields]
+            pivot_options = [None] + profile.names + [f"{p}_year" for p in date_fields] + [f"{p}_week" for p in date_fields]
+
             for i in range(num_tiles):
                 st.subheader(f"Tile {i+1} Configuration")
                 tile_title = st.text_input(f"Tile {i+1} Title", value=f"Tile {i+1}", key=f"tile_title_{i}")
                 model_name = st.text_input(f"Model Name for Tile {i+1}", value=DEFAULT_MODEL_NAME, key=f"model_name_{i}")
                 tile_type = st.selectbox(f"Tile Type for Tile {i+1}", ["looker_line", "looker_bar", "single_value", "looker_grid"], key=f"tile_type_{i}")
 
-                # Fetching time-based and non-time-based fields
-                date_fields = [col for col in data.columns if 'date' in col.lower() or pd.api.types.is_datetime64_any_dtype(data[col])]
-                all_dimensions = list(data.columns) + [f"{col}_year" for col in date_fields] + [f"{col}_month" for col in date_fields]
-
                 selected_fields = st.multiselect(f"Select Fields for Tile {i+1}", all_dimensions, key=f"fields_{i}")
 
                 # Pivots
-                pivot_options =  [None] + list(data.columns) + [f"{p}_year" for p in date_fields] + [f"{p}_week" for p in date_fields]
-
                 pivots = st.selectbox(
                     f"Pivots for Tile {i+1}",
                     pivot_options,
@@ -27,6 +27,10 @@
     "import matplotlib.pyplot as plt  # Import matplotlib\n",
     "import os\n",
     "\n",
+    "from column_profiler import (CARDINALITY_METHODS, UNIQUE_RATIO_THRESHOLD, DatasetProfile, build_profile,\n",
+    "                             infer_lookml_type)\n",
+    "from flat_file_loader import file_digest\n",
+    "\n",
     "# ----------------------- Constants -----------------------\n",
     "SUPPORTED_FILE_TYPES = [\"csv\", \"json\", \"yaml\", \"yml\"]\n",
     "DEFAULT_MODEL_NAME = \"your_model_name\"\n",
@@ -41,31 +45,26 @@
     "\n",
     "def infer_data_type(column: pd.Series) -> str:\n",
     "    \"\"\"Infers the data type of a Pandas Series.\"\"\"\n",
-    "    if pd.api.types.is_datetime64_any_dtype(column):\n",
-    "        return \"date\"\n",
-    "    elif pd.api.types.is_numeric_dtype(column):\n",
-    "        return \"number\"\n",
-    "    else:\n",
-    "        return \"string\"\n",
+    "    return infer_lookml_type(column.dtype)\n",
     "\n",
     "# ----------------------- Automated Classification -----------------------\n",
-    "def auto_classify_columns(df: pd.DataFrame) -> Dict[str, Dict[str, str]]:\n",
-    "    \"\"\"Automatically classifies columns as dimensions or measures.\"\"\"\n",
+    "def auto_classify_columns(profile: DatasetProfile) -> Dict[str, Dict[str, str]]:\n",
+    "    \"\"\"Automatically classifies columns as dimensions or measures from the cached column profile.\"\"\"\n",
     "    column_config = {}\n",
     "\n",
-    "    for col in df.columns:\n",
-    "        unique_ratio = df[col].nunique() / len(df)\n",
-    "        data_type = infer_data_type(df[col])\n",
+    "    for col, column_profile in profile.columns.items():\n",
+    "        unique_ratio = column_profile.unique_ratio\n",
+    "        data_type = column_profile.data_type\n",
     "\n",
     "        # Classify based on uniqueness and data type\n",
     "        if data_type == \"number\":\n",
-    "            field_type = \"measure\" if unique_ratio < 0.1 else \"dimension\"\n",
+    "            field_type = \"measure\" if unique_ratio < UNIQUE_RATIO_THRESHOLD else \"dimension\"\n",
     "        elif data_type == \"date\":\n",
     "            field_type = \"dimension\"\n",
     "        elif data_type == \"yesno\":\n",
     "            field_type = \"dimension\"\n",
     "        else:\n",
-    "            field_type = \"dimension\" if unique_ratio > 0.1 else \"measure\"\n",
+    "            field_type = \"dimension\" if unique_ratio > UNIQUE_RATIO_THRESHOLD else \"measure\"\n",
     "\n",
     "        column_config[col] = {\n",
     "            \"field_type\": field_type,\n",
@@ -75,9 +74,8 @@
     "    return column_config\n",
     "\n",
     "# ----------------------- Dashboard Suggestion -----------------------\n",
-    "def suggest_dashboard_layout(df: pd.DataFrame) -> List[Dict[str, Any]]:\n",
-    "    \"\"\"Suggests dashboard tiles based on dataset structure.\"\"\"\n",
-    "    column_config = auto_classify_columns(df)\n",
+    "def suggest_dashboard_layout(column_config: Dict[str, Dict[str, str]]) -> List[Dict[str, Any]]:\n",
+    "    \"\"\"Suggests dashboard tiles from the auto-classified column configuration.\"\"\"\n",
     "    time_fields = [col for col, cfg in column_config.items() if cfg[\"data_type\"] == \"date\"]\n",
     "    numeric_measures = [col for col, cfg in column_config.items() if cfg[\"field_type\"] == \"measure\"]\n",
     "    categorical_dimensions = [col for col, cfg in column_config.items() if cfg[\"field_type\"] == \"dimension\"]\n",
@@ -181,6 +179,18 @@
     "        st.error(f\"⚠️ Error loading file: {e}\")\n",
     "        return None\n",
     "\n",
+    "def uploaded_file_hash(uploaded_file) -> str:\n",
+    "    \"\"\"Content hash of the upload, computed once per upload and kept in session state.\"\"\"\n",
+    "    hashes = st.session_state.setdefault(\"file_hashes\", {})\n",
+    "    if uploaded_file.file_id not in hashes:\n",
+    "        hashes[uploaded_file.file_id] = file_digest(uploaded_file)\n",
+    "    return hashes[uploaded_file.file_id]\n",
+    "\n",
+    "@st.cache_data(show_spinner=\"Profiling columns...\", max_entries=16)\n",
+    "def cached_profile(file_key: tuple, cardinality_method: str, _data: pd.DataFrame) -> DatasetProfile:\n",
+    "    \"\"\"Column profile for one file and set of load options; reruns and re-uploads of the same file reuse it.\"\"\"\n",
+    "    return build_profile(_data, method=cardinality_method)\n",
+    "\n",
     "# ----------------------- LookML Generation -----------------------\n",
     "def generate_lookml_view(df: pd.DataFrame, view_name: str, column_config: Dict[str, Dict[str, str]],\n",
     "                         sql_table_name: str) -> str:\n",
@@ -268,9 +278,14 @@
     "    )\n",
     "\n",
     "    if uploaded_file is not None:\n",
+    "        cardinality_method = st.sidebar.selectbox(\n",
+    "            \"Cardinality Profiling\", CARDINALITY_METHODS,\n",
+    "            help=\"auto samples rows and falls back to a full pass near the threshold; exact uses nunique()\",\n",
+    "        )\n",
     "        data = load_flat_file(uploaded_file)\n",
     "\n",
     "        if data is not None:\n",
+    "            profile = cached_profile((uploaded_file_hash(uploaded_file),), cardinality_method, data)\n",
     "            st.write(\"### 🗂️ Data Preview\")\n",
     "            st.dataframe(data.head())\n",
     "\n",
@@ -280,19 +295,19 @@
     "            sql_table_name = st.text_input(\"SQL Table Name\", value=f\"ANALYTICS_DEV.GSUNDARESAN_CORE.{view_name}\")\n",
     "\n",
     "            # --- Automated Column Configuration ---\n",
+    "            auto_config = auto_classify_columns(profile)\n",
     "            if st.checkbox(\"✨ Auto-Configure Columns\"):\n",
-    "                column_config = auto_classify_columns(data)\n",
+    "                column_config = auto_config\n",
     "                st.write(\"#### Auto-Generated Column Configuration:\")\n",
     "                st.write(column_config)\n",
     "            else:\n",
     "                column_config = {}\n",
     "                st.write(\"### 🔧 Configure Columns:\")\n",
     "\n",
-    "                for col in data.columns:\n",
+    "                for col in profile.names:\n",
     "                    st.markdown(f\"**Column:** `{col}`\")\n",
-    "                    col_dtype = data[col].dtype\n",
     "                    default_field_type = \"dimension\"\n",
-    "                    default_data_type = infer_data_type(data[col])\n",
+    "                    default_data_type = profile[col].data_type\n",
     "\n",
     "                    field_type = st.selectbox(\n",
     "                        f\"Field type for `{col}`\",\n",
@@ -338,7 +353,7 @@
     "\n",
     "            # --- Automated Dashboard Suggestions ---\n",
     "            if st.checkbox(\"💡 Suggest Dashboard Layout\"):\n",
-    "                tile_suggestions = suggest_dashboard_layout(data)\n",
+    "                tile_suggestions = suggest_dashboard_layout(auto_config)\n",
     "                st.write(\"#### Suggested Dashboard Layout:\")\n",
     "                st.write(tile_suggestions)\n",
     "                st.write(\"#### Dashboard Mockup:\")\n",
@@ -349,6 +364,12 @@
     "                tile_configs = []\n",
     "                num_tiles = st.number_input(\"🧱 Number of Tiles\", min_value=1, max_value=10, value=2, step=1)\n",
     "\n",
+    "                # Field options are the same for every tile, so they are built once from the profile\n",
+    "                date_fields = profile.date_fields\n",
+    "                all_dimensions = profile.names + [f\"{col}_year\" for col in date_fields] + [\n",
+    "                                    f\"{col}_month\" for col in date_fields]\n",
+    "                pivot_options = [None] + profile.names\n",
+    "\n",
     "                for i in range(num_tiles):\n",
     "                    st.subheader(f\"Tile {i+1} Configuration\")\n",
     "                    tile_title = st.text_input(f\"Tile {i+1} Title\", value=f\"Tile {i+1}\", key=f\"tile_title_{i}\")\n",
@@ -357,17 +378,8 @@
     "                                            [\"looker_line\", \"looker_bar\", \"single_value\", \"looker_grid\"],\n",
     "                                            key=f\"tile_type_{i}\")\n",
     "\n",
-    "                    # Fetching time-based and non-time-based fields\n",
-    "                    date_fields = [col for col in data.columns if\n",
-    "                                'date' in col.lower() or pd.api.types.is_datetime64_any_dtype(data[col])]\n",
-    "                    all_dimensions = list(data.columns) + [f\"{col}_year\" for col in date_fields] + [\n",
-    "                                        f\"{col}_month\" for col in date_fields]\n",
-    "\n",
     "                    selected_fields = st.multiselect(f\"Select Fields for Tile {i+1}\", all_dimensions, key=f\"fields_{i}\")\n",
     "\n",
-    "                    # Pivots\n",
-    "                    pivot_options = [None] + list(data.columns)\n",
-    "\n",
     "                    tile_configs.append({\n",
     "                        \"tile_title\": tile_title,\n",
     "                        \"model_name\": model_name,\n",
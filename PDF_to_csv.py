@@ -1,123 +1,250 @@
 import streamlit as st
-import fitz  # PyMuPDF
 import pandas as pd
-import snowflake.connector
-import boto3
 import os
-import re
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import hashlib
+import tempfile
+import uuid
+from concurrent.futures import wait
+from contextlib import ExitStack
+import pyarrow.parquet as pq
 from botocore.exceptions import NoCredentialsError
-from io import BytesIO
+from datetime import datetime, time, timezone
+from expense_pipeline import (DEFAULT_CACHE_PATH, DEFAULT_MAX_WORKERS, DEFAULT_STORE_PATH, REPORT_MIME_TYPES, ExpenseStore,
+                              ExpenseSummary, ParseCache, ReportWriter, compact_frame, extract_all)
+import expense_sources
+import instrumentation
+from expense_sources import S3_PREFIX, SPOOL_CHUNK_BYTES, spool_uploads
+from expense_mailer import get_mailer
+from expense_warehouse import upload_to_snowflake
 
 # Configuration
-AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY')
-AWS_SECRET_KEY = os.getenv('AWS_SECRET_KEY')
-S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
-
-SNOWFLAKE_CONFIG = {
-    'user': os.getenv('SNOWFLAKE_USER'),
-    'password': os.getenv('SNOWFLAKE_PASSWORD'),
-    'account': os.getenv('SNOWFLAKE_ACCOUNT'),
-    'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE'),
-    'database': os.getenv('SNOWFLAKE_DATABASE'),
-    'schema': os.getenv('SNOWFLAKE_SCHEMA')
-}
-
-EMAIL_SENDER = os.getenv('EMAIL_SENDER')
-EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
-
-CATEGORY_KEYWORDS = {
-    'travel': ['flight', 'airfare', 'uber', 'ola', 'taxi', 'train', 'bus', 'hotel'],
-    'food': ['restaurant','swiggy','zomato','doordash', 'dinner', 'lunch', 'breakfast', 'cafe', 'meal', 'food'],
-    'other': []
-}
-
-def send_email(subject, body, attachment, receiver_email):
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_SENDER
-    msg['To'] = receiver_email
-    msg['Subject'] = subject
-
-    msg.attach(MIMEText(body, 'plain'))
-
-    part = MIMEBase('application', 'octet-stream')
-    part.set_payload(attachment)
-    encoders.encode_base64(part)
-    part.add_header('Content-Disposition', f"attachment; filename=master_expense_report.xlsx")
-    msg.attach(part)
-
+EXTRACT_MAX_WORKERS = int(os.getenv('EXTRACT_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+PARSE_CACHE_PATH = os.getenv('PARSE_CACHE_PATH', DEFAULT_CACHE_PATH)
+PARSE_CACHE_MAX_MB = int(os.getenv('PARSE_CACHE_MAX_MB', '512'))
+EXPENSE_STORE_PATH = os.getenv('EXPENSE_STORE_PATH', DEFAULT_STORE_PATH)
+REPORT_DIR = os.getenv('REPORT_DIR', tempfile.gettempdir())
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR') or None
+PREVIEW_ROWS = 1000
+EMAIL_WAIT_SECONDS = float(os.getenv('EMAIL_WAIT_SECONDS', '5'))
+
+def send_email(subject, body, attachment_path, receiver_email, attachment_name="master_expense_report.xlsx"):
+    """Queues the report for background delivery to one or more comma-separated addresses.
+
+    Waits up to EMAIL_WAIT_SECONDS for the mailer; deliveries still running
+    after that are reported by report_deliveries on a later rerun.
+    """
+    recipients = [address.strip() for address in receiver_email.split(',') if address.strip()]
+    if not recipients:
+        st.error("Please enter at least one receiver email.")
+        return
     try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.sendmail(EMAIL_SENDER, receiver_email, msg.as_string())
-        st.success(f"Email sent successfully to {receiver_email}")
+        with instrumentation.span('email.queue', recipients=len(recipients)):
+            futures = get_mailer().send(subject, body, recipients, attachment_path, attachment_name)
+        instrumentation.count('email.recipients', len(recipients))
+        instrumentation.count('email.attachment_bytes', os.path.getsize(attachment_path))
     except Exception as e:
         st.error(f"Failed to send email: {e}")
-
-def fetch_pdfs_from_s3():
-    s3 = boto3.client('s3', aws_access_key_id=AWS_ACCESS_KEY, aws_secret_access_key=AWS_SECRET_KEY)
-    pdf_files = []
+        return
+    wait(futures, timeout=EMAIL_WAIT_SECONDS)
+    st.session_state.setdefault('email_deliveries', []).append((recipients, futures))
+
+def report_deliveries():
+    """Shows the outcome of each finished email delivery once; unfinished ones are kept for a later rerun."""
+    pending = []
+    for recipients, futures in st.session_state.get('email_deliveries', []):
+        if not all(future.done() for future in futures):
+            pending.append((recipients, futures))
+            continue
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            st.error(f"Failed to send email to {', '.join(recipients)}: {errors[0]}")
+        else:
+            st.success(f"Report delivered to {', '.join(recipients)}")
+    for recipients, _ in pending:
+        st.info(f"Report queued for delivery to {', '.join(recipients)}")
+    st.session_state['email_deliveries'] = pending
+
+@st.cache_resource
+def get_s3_client():
+    """One boto3 client per server process, shared by every session and rerun."""
+    return expense_sources.create_s3_client()
+
+@st.cache_resource
+def get_parse_cache():
+    """One parse cache connection per server process, shared by every session and rerun."""
+    return ParseCache(PARSE_CACHE_PATH, max_bytes=PARSE_CACHE_MAX_MB * 1024 * 1024)
+
+def fetch_pdfs_from_s3(**kwargs):
     try:
-        response = s3.list_objects_v2(Bucket=S3_BUCKET_NAME)
-        for obj in response.get('Contents', []):
-            if obj['Key'].endswith('.pdf'):
-                pdf_obj = s3.get_object(Bucket=S3_BUCKET_NAME, Key=obj['Key'])
-                pdf_files.append((obj['Key'], pdf_obj['Body'].read()))
+        yield from expense_sources.fetch_pdfs_from_s3(s3=get_s3_client(), **kwargs)
     except NoCredentialsError:
         st.error("AWS credentials not found.")
-    return pdf_files
 
-# (Other helper functions remain unchanged)
+def upload_digest(file):
+    """Content hash of one upload, computed once per upload and kept in session state."""
+    digests = st.session_state.setdefault('upload_digests', {})
+    if file.file_id not in digests:
+        file_digest = hashlib.sha256()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(SPOOL_CHUNK_BYTES), b''):
+            file_digest.update(chunk)
+        file.seek(0)
+        digests[file.file_id] = file_digest.digest()
+    return digests[file.file_id]
+
+def uploaded_files_key(uploaded_files):
+    """Hashes the names and contents of the uploaded files into one batch key."""
+    digest = hashlib.sha256()
+    for file in uploaded_files:
+        digest.update(file.name.encode())
+        digest.update(upload_digest(file))
+    return digest.hexdigest()
+
+def report_path_for(run_key, report_format):
+    """Report path in this session's own directory, so sessions never write to each other's files."""
+    if 'report_dir' not in st.session_state:
+        st.session_state['report_dir'] = tempfile.mkdtemp(prefix="expense-reports-", dir=REPORT_DIR)
+    return os.path.join(st.session_state['report_dir'], f"master_expense_report_{run_key[:16]}.{report_format}")
+
+def process_batch(run_key, pdf_files, parse_cache, expense_store, max_workers, report_format):
+    """Parses a batch once and keeps the result in session state.
+
+    Streamlit reruns the whole script on every widget interaction, so the
+    email and Snowflake buttons read this cached run instead of parsing the
+    batch again. Rows stream into the report (and a Parquet copy that later
+    format changes and uploads read back); the run keeps only a preview and
+    the running summary.
+    """
+    report_paths = {report_format: report_path_for(run_key, report_format)}
+    report_paths.setdefault('parquet', report_path_for(run_key, 'parquet'))
+    merged = 0
+    summary = ExpenseSummary()
+    preview = []
+    warnings = []
+    notes = []
+
+    with st.spinner("Extracting expenses..."), ExitStack() as stack:
+        report_writers = [stack.enter_context(ReportWriter(path, fmt)) for fmt, path in report_paths.items()]
+
+        def emit(df):
+            for report_writer in report_writers:
+                report_writer.write(df)
+            preview_rows = sum(len(fragment) for fragment in preview)
+            if preview_rows < PREVIEW_ROWS:
+                preview.append(df.head(PREVIEW_ROWS - preview_rows))
+            summary.update(df)
+
+        for result in extract_all(pdf_files, max_workers=max_workers, cache=parse_cache):
+            if result.warning:
+                warnings.append(result.warning)
+                continue
+            if expense_store is not None:
+                expense_store.merge(result.file_name, result.df)
+                merged += 1
+            else:
+                emit(result.df)
+
+        if expense_store is not None:
+            notes.append(f"Merged {merged} new or changed receipts into the master expense table.")
+            for chunk in expense_store.iter_master():
+                emit(chunk)
+
+    run = {
+        'key': run_key,
+        'preview': compact_frame(pd.concat(preview, ignore_index=True)) if preview else pd.DataFrame(),
+        'summary': summary,
+        'warnings': warnings,
+        'notes': notes,
+        'reports': report_paths,
+    }
+    st.session_state['expense_run'] = run
+    return run
+
+def master_frame(run):
+    """Reads the run's full master frame back from its Parquet copy."""
+    return compact_frame(pd.read_parquet(run['reports']['parquet']))
+
+def report_for(run, report_format):
+    """Returns the run's report in report_format, converting it from the Parquet copy if needed."""
+    if report_format not in run['reports']:
+        report_path = report_path_for(run['key'], report_format)
+        with ReportWriter(report_path, report_format) as report_writer:
+            for batch in pq.ParquetFile(run['reports']['parquet']).iter_batches():
+                report_writer.write(batch.to_pandas())
+        run['reports'][report_format] = report_path
+    return run['reports'][report_format]
 
 # Streamlit App
 st.title("📊 PDF Expense Reporting App")
 
+# One recorder per session; it collects spans across reruns and button clicks.
+if 'recorder' not in st.session_state:
+    st.session_state['recorder'] = instrumentation.Recorder(f"expense-app-{uuid.uuid4().hex[:8]}")
+recorder = instrumentation.activate(st.session_state['recorder'])
+
+max_workers = st.sidebar.number_input("Parallel extraction workers", min_value=1, value=EXTRACT_MAX_WORKERS, step=1)
+report_format = st.sidebar.selectbox("Report format", list(REPORT_MIME_TYPES))
+
 source_choice = st.radio("Select PDF Source", ('Local Files', 'AWS S3 Bucket'))
 
-pdf_files = []
+run = st.session_state.get('expense_run')
+parse_cache = get_parse_cache()
 if source_choice == 'Local Files':
     uploaded_files = st.file_uploader("Upload PDF files", type=['pdf'], accept_multiple_files=True)
     if uploaded_files:
-        pdf_files = [(file.name, file.read()) for file in uploaded_files]
+        run_key = uploaded_files_key(uploaded_files)
+        if run is None or run['key'] != run_key:
+            # Uploads are spooled to disk as the workers ask for them and
+            # opened there by path, so no PDF is copied into this process or
+            # pickled to a worker; the spool is removed once the batch is done.
+            with tempfile.TemporaryDirectory(dir=UPLOAD_SPOOL_DIR) as spool_dir:
+                pdf_files = spool_uploads(uploaded_files, spool_dir)
+                run = process_batch(run_key, pdf_files, parse_cache, None, max_workers, report_format)
+    else:
+        run = None
 else:
+    s3_prefix = st.text_input("S3 key prefix", value=S3_PREFIX)
+    since_date = st.date_input("Only objects modified on or after", value=None)
+    incremental = st.checkbox("Incremental sync (only new or changed objects)")
     if st.button("Fetch PDFs from S3"):
-        pdf_files = fetch_pdfs_from_s3()
-
-if pdf_files:
-    all_dataframes = []
-    for file_name, pdf_bytes in pdf_files:
-        text = extract_text_from_pdf(pdf_bytes)
-        if not text:
-            st.warning(f"Failed to extract text from {file_name}")
-            continue
-
-        passenger_name = extract_passenger_name(text)
-        complexity = analyze_pdf_complexity(text)
-        df = parse_text_to_dataframe(text, complexity)
-        df = clean_dataframe(df)
-        df['Passenger_Name'] = passenger_name
-        all_dataframes.append(df)
-
-    if all_dataframes:
-        master_df = pd.concat(all_dataframes, ignore_index=True)
-        st.dataframe(master_df)
+        modified_since = datetime.combine(since_date, time.min, tzinfo=timezone.utc) if since_date else None
+        expense_store = ExpenseStore(EXPENSE_STORE_PATH) if incremental else None
+        pdf_files = fetch_pdfs_from_s3(prefix=s3_prefix, modified_since=modified_since, cache=parse_cache, store=expense_store)
+        run = process_batch("s3-" + uuid.uuid4().hex, pdf_files, parse_cache, expense_store, max_workers, report_format)
+    elif run is not None and not run['key'].startswith("s3-"):
+        run = None
+
+if run is not None:
+    for warning in run['warnings']:
+        st.warning(warning)
+    for note in run['notes']:
+        st.info(note)
+
+    summary = run['summary']
+    if summary.line_items:
+        st.dataframe(run['preview'])
+        if summary.line_items > len(run['preview']):
+            st.caption(f"Showing the first {len(run['preview']):,} of {summary.line_items:,} line items; "
+                       "download the report for the rest.")
 
         st.subheader("Overall Preview")
-        st.write(master_df.describe(include='all'))
+        overview_col, passenger_col = st.columns([1, 2])
+        overview_col.dataframe(summary.overview())
+        passenger_col.dataframe(summary.by_passenger(), hide_index=True)
 
-        excel_buffer = BytesIO()
-        master_df.to_excel(excel_buffer, index=False)
-        st.download_button("Download Master Expense Report", data=excel_buffer.getvalue(), file_name="master_expense_report.xlsx", mime="application/vnd.ms-excel")
+        report_path = report_for(run, report_format)
+        report_name = f"master_expense_report.{report_format}"
+        with open(report_path, 'rb') as report_file:
+            st.download_button("Download Master Expense Report", data=report_file, file_name=report_name, mime=REPORT_MIME_TYPES[report_format])
 
-        receiver_email = st.text_input("Enter receiver email for the report")
+        receiver_email = st.text_input("Enter receiver emails for the report (comma-separated)")
         if st.button("Send Report via Email"):
-            send_email("Master Expense Report", "Please find the attached expense report.", excel_buffer.getvalue(), receiver_email)
+            send_email("Master Expense Report", "Please find the attached expense report.", report_path, receiver_email, report_name)
+        report_deliveries()
 
         if st.button("Upload to Snowflake"):
-            upload_to_snowflake(master_df, 'EXPENSE_REPORTS')
-            st.success("Uploaded to Snowflake successfully!")
+            inserted = upload_to_snowflake(master_frame(run), 'EXPENSE_REPORTS')
+            st.success(f"Uploaded to Snowflake successfully! {inserted} new rows loaded.")
+
+instrumentation.render_sidebar(recorder)
+recorder.flush()
@@ -0,0 +1,68 @@
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from expense_pipeline import CATEGORY_KEYWORDS, KeywordCategorizer
+
+# Micro-benchmark: per-row, per-keyword substring scan (the previous
+# categorize_expense) against the compiled KeywordCategorizer, with the
+# keyword table padded out to a few hundred synthetic merchants.
+#
+#   python bench_categorizer.py --rows 100000 --merchants 500
+
+def categorize_by_scan(description, category_keywords):
+    description = description.lower()
+    for category, keywords in category_keywords.items():
+        for keyword in keywords:
+            if keyword in description:
+                return category
+    return 'other'
+
+def build_keywords(merchants):
+    category_keywords = {category: list(keywords) for category, keywords in CATEGORY_KEYWORDS.items()}
+    for i in range(merchants):
+        category = 'travel' if i % 2 else 'food'
+        category_keywords[category].append(f"merchant{i:04d}")
+    return category_keywords
+
+def build_descriptions(rows, category_keywords, seed=0):
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in category_keywords.values() for keyword in keywords]
+    fillers = ['payment', 'order', 'receipt', 'invoice', 'charge', 'service', 'ref', 'misc']
+    descriptions = []
+    for _ in range(rows):
+        words = rng.sample(fillers, 3)
+        if rng.random() < 0.7:
+            words.insert(rng.randrange(4), rng.choice(keywords).title())
+        descriptions.append(" ".join(words))
+    return pd.Series(descriptions)
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--merchants', type=int, default=500)
+    args = parser.parse_args()
+
+    category_keywords = build_keywords(args.merchants)
+    descriptions = build_descriptions(args.rows, category_keywords)
+
+    categorizer, compile_seconds = timed(lambda: KeywordCategorizer(category_keywords))
+    scanned, scan_seconds = timed(lambda: descriptions.apply(categorize_by_scan, args=(category_keywords,)))
+    compiled, compiled_seconds = timed(lambda: categorizer.categorize(descriptions))
+
+    keyword_count = sum(len(keywords) for keywords in category_keywords.values())
+    print(f"{args.rows} rows x {keyword_count} keywords")
+    print(f"  substring scan : {scan_seconds:8.3f}s  ({args.rows / scan_seconds:,.0f} rows/s)")
+    print(f"  compiled regex : {compiled_seconds:8.3f}s  ({args.rows / compiled_seconds:,.0f} rows/s)"
+          f"  + {compile_seconds * 1000:.1f}ms compile")
+    print(f"  agreement      : {(scanned == compiled).mean():.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from column_profiler import CARDINALITY_METHODS, DEFAULT_PROFILE_WORKERS, UNIQUE_RATIO_THRESHOLD, profile_cardinality
+
+# Benchmark: the per-column df[col].nunique() / len(df) loop that
+# auto_classify_columns used to run, against profile_cardinality in each
+# mode, on a wide frame mixing low- and high-cardinality numbers, strings
+# and dates, plus skewed columns (one value in 95% of rows, or Zipf) whose
+# samples are mostly singletons and mislead a naive estimate. Columns share a handful of base arrays (copy=False), so a
+# 10M x 300 frame fits in a few GB while every column is still profiled
+# in full.
+#
+#   python bench_column_profiler.py --rows 10000000 --columns 300 --workers 8
+
+def build_frame(rows, columns, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"label_{i}" for i in range(20_000)], dtype=object)
+    kinds = {
+        'low_int': rng.integers(0, 1_000, rows),
+        'key': np.arange(rows),
+        'amount': rng.random(rows) * 1_000,
+        'near_threshold': rng.integers(0, max(1, int(rows * UNIQUE_RATIO_THRESHOLD)), rows),
+        'label': pd.Series(labels[rng.integers(0, len(labels), rows)], dtype='str'),
+        'day': np.datetime64('2020-01-01', 's') + rng.integers(0, 2_000, rows).astype('timedelta64[D]'),
+        'skewed': np.where(rng.random(rows) < 0.95, -1, np.arange(rows)),
+        'zipf': rng.zipf(1.3, rows),
+    }
+    # Convert each base once; pandas would otherwise convert (and copy) it per column.
+    kinds = {name: pd.Series(values, copy=False) for name, values in kinds.items()}
+    names = list(kinds)
+    data = {f"{names[i % len(names)]}_{i}": kinds[names[i % len(names)]] for i in range(columns)}
+    return pd.DataFrame(data, copy=False)
+
+def classify(ratios):
+    return {col: ratio < UNIQUE_RATIO_THRESHOLD for col, ratio in ratios.items()}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--columns', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=DEFAULT_PROFILE_WORKERS)
+    parser.add_argument('--methods', nargs='+', default=list(CARDINALITY_METHODS), choices=CARDINALITY_METHODS)
+    args = parser.parse_args()
+
+    df = build_frame(args.rows, args.columns)
+    print(f"{args.rows:,} rows x {args.columns} columns, {args.workers} workers", flush=True)
+
+    start = time.perf_counter()
+    exact = {col: df[col].nunique() / len(df) for col in df.columns}
+    loop_seconds = time.perf_counter() - start
+    print(f"  nunique loop   : {loop_seconds:8.2f}s", flush=True)
+
+    expected = classify(exact)
+    for method in args.methods:
+        start = time.perf_counter()
+        profile = profile_cardinality(df, method=method, max_workers=args.workers)
+        seconds = time.perf_counter() - start
+        ratios = {col: cardinality.ratio for col, cardinality in profile.items()}
+        agreement = np.mean([classify(ratios)[col] == expected[col] for col in df.columns])
+        error = max(abs(ratios[col] - exact[col]) for col in df.columns)
+        full_passes = sum(1 for cardinality in profile.values() if cardinality.method != 'sample')
+        print(f"  {method:<15}: {seconds:8.2f}s  ({loop_seconds / seconds:.1f}x)  classification agreement "
+              f"{agreement:.1%}, max ratio error {error:.4f}, {full_passes} full-column passes", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from wbr_metrics import (DEFAULT_INSIGHT, INSIGHT_RULES, NO_DATA_INSIGHT, METRICS, compare_frames,
+                         comparison_summary)
+
+# Micro-benchmark: the per-key Python loop compare_weeks used to run (plus
+# the iterrows() summary rendering) against compare_frames and
+# comparison_summary, over metrics broken down by region and campaign.
+#
+#   python bench_compare_weeks.py --regions 20 --campaigns 10 --metrics 50   # 10k rows
+
+KEYS = ['Region', 'Campaign', 'Metric']
+
+def insight_by_branching(metric, delta, pct):
+    if pct is None:
+        return NO_DATA_INSIGHT
+    for fragment, when_up, when_down in INSIGHT_RULES:
+        if fragment in metric:
+            return when_up if delta > 0 else when_down
+    return DEFAULT_INSIGHT
+
+def compare_by_loop(curr, prev):
+    comparison = []
+    for key, current in curr.items():
+        previous = prev.get(key)
+        if previous is None:
+            delta, pct_change = None, None
+        else:
+            delta = current - previous
+            pct_change = (delta / previous * 100) if previous else None
+        comparison.append({
+            'Region': key[0], 'Campaign': key[1], 'Metric': key[2],
+            'Current Week': round(current, 2),
+            'Previous Week': round(previous, 2) if previous is not None else None,
+            'Change': round(delta, 2) if delta is not None else None,
+            'Percent Change (%)': round(pct_change, 2) if pct_change is not None else None,
+            'Insight': insight_by_branching(key[2], delta, pct_change),
+        })
+    comparison_df = pd.DataFrame(comparison)
+    lines = []
+    for _, row in comparison_df.iterrows():
+        arrow = "🔺" if row["Change"] > 0 else "🔻"
+        lines.append(f"**{arrow} {row['Metric']}**: {row['Current Week']} ({row['Percent Change (%)']}%) — _{row['Insight']}_")
+    return comparison_df, lines
+
+def build_weeks(regions, campaigns, metrics, seed=0):
+    rng = random.Random(seed)
+    names = [f"{METRICS[i % len(METRICS)]} {i // len(METRICS)}" for i in range(metrics)]
+    rows = [(f"R{r:02d}", f"C{c:02d}", name) for r in range(regions) for c in range(campaigns) for name in names]
+    current = pd.DataFrame(rows, columns=KEYS)
+    current['value'] = [rng.uniform(0, 1000) for _ in rows]
+    # About 5% of previous values are missing and 5% are zero.
+    previous = current.sample(frac=0.95, random_state=seed).copy()
+    previous['value'] = [0.0 if rng.random() < 0.05 else rng.uniform(0, 1000) for _ in range(len(previous))]
+    return current, previous
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--regions', type=int, default=20)
+    parser.add_argument('--campaigns', type=int, default=10)
+    parser.add_argument('--metrics', type=int, default=50)
+    args = parser.parse_args()
+
+    current, previous = build_weeks(args.regions, args.campaigns, args.metrics)
+    curr_dict = dict(zip(current[KEYS].itertuples(index=False, name=None), current['value']))
+    prev_dict = dict(zip(previous[KEYS].itertuples(index=False, name=None), previous['value']))
+
+    (looped, _), loop_seconds = timed(lambda: compare_by_loop(curr_dict, prev_dict))
+    vectorized, vector_seconds = timed(lambda: compare_frames(current, previous, keys=KEYS))
+    _, summary_seconds = timed(lambda: comparison_summary(vectorized, keys=KEYS))
+
+    agreement = (looped['Insight'].to_numpy() == vectorized['Insight'].to_numpy()).mean()
+    print(f"{len(current):,} metric rows ({len(current) - len(previous):,} without a previous value)")
+    print(f"  dict loop + iterrows : {loop_seconds:8.3f}s")
+    print(f"  compare_frames       : {vector_seconds:8.3f}s  + {summary_seconds:.3f}s summary")
+    print(f"  insight agreement    : {agreement:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+from expense_pipeline import (LazyReceipt, ReportWriter, analyze_pdf_complexity, clean_dataframe, extract_all,
+                              extract_passenger_name, parse_text_to_dataframe)
+
+# Stage benchmark for the PDF_to_csv.py flow over a synthetic receipt
+# corpus: simple (one line per item) and complex (tabular) layouts, 1 to
+# 100 pages, travel and food line items. Each corpus size runs in a fresh
+# process so its peak RSS is its own. Compare the JSON across commits.
+#
+#   python bench_pipeline.py --sizes 10,1000,10000 --output bench_results.json
+#   python bench_pipeline.py --sizes 1000 --workers 8
+
+ITEMS = {
+    'travel': ['Uber ride to airport', 'Flight BLR-DEL', 'Taxi to hotel', 'Hotel Marriott night', 'Train ticket',
+               'Ola cab', 'Airport bus'],
+    'food': ['Lunch at cafe', 'Dinner with client', 'Breakfast buffet', 'Swiggy order', 'Zomato delivery',
+             'Team meal', 'Restaurant bill'],
+}
+NAMES = ['Jane Doe', 'John Smith', 'Priya Raman', 'Arjun Mehta', 'Maria Garcia', 'Wei Chen']
+LINES_PER_PAGE = 48
+STAGES = ['extract', 'analyze', 'parse', 'clean']
+
+# ----------------------- Synthetic Corpus -----------------------
+def receipt_items(rng, count):
+    start = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    for _ in range(count):
+        category = rng.choice(list(ITEMS))
+        yield (start + timedelta(days=rng.randrange(30))).isoformat(), rng.choice(ITEMS[category]), rng.uniform(5, 2500)
+
+def make_receipt(rng, layout, pages):
+    """Builds one receipt PDF with about LINES_PER_PAGE line items per page and a final total.
+
+    A "Total Nights" header line above the items, as on a hotel folio, checks
+    that the reader does not stop at a header that merely starts with "Total".
+    """
+    doc = fitz.open()
+    items = list(receipt_items(rng, pages * LINES_PER_PAGE - 3))
+    total = sum(amount for _, _, amount in items)
+    label = 'Passenger Name' if layout == 'simple' else 'Guest'
+    header = [(None, f"{label}: {rng.choice(NAMES)}", None), (None, f"Total Nights: {rng.randint(1, 7)}", None)]
+    rows = header + items + [(None, 'Total', total)]
+
+    for start in range(0, len(rows), LINES_PER_PAGE):
+        page = doc.new_page()
+        y = 60
+        for item_date, description, amount in rows[start:start + LINES_PER_PAGE]:
+            if amount is None:
+                page.insert_text((50, y), description)
+            elif layout == 'simple':
+                prefix = f"{item_date} " if item_date else ""
+                page.insert_text((50, y), f"{prefix}{description} ${amount:,.2f}")
+            else:
+                # Separate cells on one baseline, as a table renders.
+                if item_date:
+                    page.insert_text((50, y), item_date)
+                page.insert_text((150, y), description)
+                page.insert_text((400, y), f"{amount:.2f}")
+            y += 15
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+def page_count(rng):
+    """Most receipts are a page or two; a long tail runs to 100 pages."""
+    return min(100, max(1, int(rng.paretovariate(1.2))))
+
+def build_corpus(size, unique, seed=0):
+    """Returns size (name, bytes) pairs cycling through at most `unique` distinct receipts.
+
+    Rendering 10,000 fresh PDFs would take longer than parsing them, so large
+    corpora reuse a pool of distinct documents; every stage still runs once
+    per file.
+    """
+    rng = random.Random(seed)
+    pool = [make_receipt(rng, 'simple' if i % 2 == 0 else 'complex', page_count(rng)) for i in range(min(size, unique))]
+    return [(f"receipt_{i:05d}.pdf", pool[i % len(pool)]) for i in range(size)]
+
+# ----------------------- Measurement -----------------------
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def stage_summary(seconds, files):
+    series = pd.Series(seconds)
+    total = float(series.sum())
+    return {
+        'total_seconds': round(total, 4),
+        'p50_ms': round(float(series.quantile(0.5)) * 1000, 3),
+        'p95_ms': round(float(series.quantile(0.95)) * 1000, 3),
+        'files_per_second': round(files / total, 1) if total else None,
+    }
+
+def run_stages(pdf_bytes):
+    """Runs one receipt through the stages in process_pdf order and returns (df, pages, timings)."""
+    timings = {}
+    started = time.perf_counter()
+    with LazyReceipt(pdf_bytes) as receipt:
+        sample = receipt.sample_text()
+        text = receipt.text_until_totals()
+        pages = receipt.pages_read
+    timings['extract'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    passenger_name = extract_passenger_name(sample)
+    complexity = analyze_pdf_complexity(sample)
+    timings['analyze'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    df = parse_text_to_dataframe(text, complexity)
+    timings['parse'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    df = clean_dataframe(df)
+    df['Passenger_Name'] = passenger_name
+    timings['clean'] = time.perf_counter() - started
+    return df, pages, timings
+
+def bench_size(size, unique, workers):
+    """Benchmarks one corpus size; meant to run in its own process."""
+    generate_started = time.perf_counter()
+    corpus = build_corpus(size, unique)
+    generate_seconds = time.perf_counter() - generate_started
+
+    stage_seconds = {stage: [] for stage in STAGES}
+    file_seconds = []
+    frames = []
+    pages = 0
+    empty_receipts = 0
+    for _, pdf_bytes in corpus:
+        df, pages_read, timings = run_stages(pdf_bytes)
+        frames.append(df)
+        empty_receipts += df.empty
+        pages += pages_read
+        for stage in STAGES:
+            stage_seconds[stage].append(timings[stage])
+        file_seconds.append(sum(timings.values()))
+
+    started = time.perf_counter()
+    master_df = pd.concat(frames, ignore_index=True)
+    concat_seconds = time.perf_counter() - started
+    del frames
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx') as report:
+        started = time.perf_counter()
+        with ReportWriter(report.name, 'xlsx') as writer:
+            writer.write(master_df)
+        xlsx_seconds = time.perf_counter() - started
+
+    result = {
+        'files': size,
+        'distinct_files': min(size, unique),
+        'pages_parsed': pages,
+        'rows': len(master_df),
+        'empty_receipts': empty_receipts,
+        'generate_seconds': round(generate_seconds, 3),
+        'stages': {stage: stage_summary(stage_seconds[stage], size) for stage in STAGES},
+        'per_file': stage_summary(file_seconds, size),
+        'concat': {'seconds': round(concat_seconds, 4)},
+        'xlsx_write': {
+            'seconds': round(xlsx_seconds, 4),
+            'rows_per_second': round(len(master_df) / xlsx_seconds, 1) if xlsx_seconds else None,
+        },
+    }
+
+    if workers > 1:
+        started = time.perf_counter()
+        for _ in extract_all(corpus, max_workers=workers):
+            pass
+        parallel_seconds = time.perf_counter() - started
+        result['extract_all'] = {
+            'workers': workers,
+            'seconds': round(parallel_seconds, 4),
+            'files_per_second': round(size / parallel_seconds, 1),
+        }
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10,1000,10000', help="comma-separated corpus sizes")
+    parser.add_argument('--unique', type=int, default=200, help="distinct receipts rendered per corpus")
+    parser.add_argument('--workers', type=int, default=1, help="also time extract_all with this many processes")
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'run_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pymupdf': fitz.VersionBind,
+        'pandas': pd.__version__,
+        'sizes': {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for size in (int(size) for size in args.sizes.split(',')):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(bench_size, size, args.unique, args.workers).result()
+        results['sizes'][str(size)] = result
+        stages = "  ".join(f"{stage} p50 {result['stages'][stage]['p50_ms']:.2f}ms" for stage in STAGES)
+        print(f"{size:>6} files  {result['per_file']['files_per_second']:>8,.1f} files/s  {stages}  "
+              f"xlsx {result['xlsx_write']['seconds']:.2f}s  peak {result['peak_rss_mb']:.0f} MB  "
+              f"{result['empty_receipts']} empty receipts")
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import re
+import time
+
+from wbr_metrics import scan_metrics
+
+# Micro-benchmark: the six per-metric re.search calls extract_metrics_from_pdf
+# used to run over the joined document text, against the single-pass
+# scan_metrics tokenizer, on a well-formed report and on a malformed one
+# where labels repeat with no dollar value after them.
+#
+#   python bench_wbr_scanner.py --repeat 5000
+
+LEGACY_PATTERNS = {
+    'Total GDV': r'Subtotal\s+\$([0-9\.]+)',
+    'Publishes': r'Publishes\s+\$([0-9\.-]+)',
+    'Publishes to NAC2': r'Publishes to NAC2.*?\$([0-9\.-]+)',
+    'Fundraiser Traffic': r'Fundraiser Traffic.*?\$([0-9\.-]+)',
+    'Donation Intent': r'Donation Intent.*?\$([0-9\.-]+)',
+    'Donation Yield': r'Donation Yield\s+\$([0-9\.-]+)',
+}
+
+def scan_by_search(text):
+    return {key: re.search(pattern, text) for key, pattern in LEGACY_PATTERNS.items()}
+
+def well_formed_report(repeat):
+    week = ("2024-01-01 Start 2024-01-07 End Subtotal $4377.69 Publishes $52.10 Publishes to NAC2 rate $4.20 "
+            "Fundraiser Traffic total $812.00 Donation Intent score $0.51 Donation Yield $44.30 ")
+    filler = "Notes for the week, no figures here. " * 20
+    return week + filler * repeat
+
+def malformed_report(repeat):
+    return "2024-01-01 Start 2024-01-07 End " + "Fundraiser Traffic Donation Intent Publishes to NAC2 " * repeat
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5000, help="size of the generated text")
+    args = parser.parse_args()
+
+    for name, text in (('well-formed', well_formed_report(args.repeat)), ('malformed', malformed_report(args.repeat))):
+        search_seconds = timed(lambda: scan_by_search(text))
+        scan_seconds = timed(lambda: scan_metrics([text]))
+        print(f"{name:<12} {len(text) / 1e6:6.2f} MB  re.search x6 {search_seconds:8.3f}s  "
+              f"scan_metrics {scan_seconds:8.3f}s")
+
+if __name__ == "__main__":
+    main()
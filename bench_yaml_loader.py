@@ -0,0 +1,60 @@
+import argparse
+import io
+import random
+import time
+
+import yaml
+
+from flat_file_loader import YAMLLoader, read_yaml
+
+# Micro-benchmark: yaml.safe_load (the pure-Python SafeLoader the LookML
+# apps used) against the libyaml CSafeLoader, on a generated config export
+# split into several documents, plus read_yaml streaming the same file into
+# record batches. CSafeLoader falls back to SafeLoader when PyYAML was built
+# without libyaml, in which case both timings match.
+#
+#   python bench_yaml_loader.py --records 50000 --documents 5
+
+def build_export(records, documents, seed=0):
+    rng = random.Random(seed)
+    per_document = max(1, records // documents)
+    docs = []
+    for d in range(documents):
+        docs.append([
+            {
+                'id': d * per_document + i,
+                'name': f"view_{d}_{i}",
+                'owner': {'team': rng.choice(['growth', 'finance', 'ops']), 'email': f"user{i}@example.com"},
+                'enabled': rng.random() < 0.8,
+                'threshold': round(rng.uniform(0, 100), 3),
+                'tags': rng.sample(['daily', 'weekly', 'pii', 'core', 'beta'], 2),
+            }
+            for i in range(per_document)
+        ])
+    return yaml.dump_all(docs, sort_keys=False, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper)).encode()
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=50_000)
+    parser.add_argument('--documents', type=int, default=10)
+    args = parser.parse_args()
+
+    export = build_export(args.records, args.documents)
+    print(f"{len(export) / 1e6:.1f} MB, {args.records:,} records in {args.documents} documents "
+          f"(loader: {YAMLLoader.__name__})")
+
+    _, pure_seconds = timed(lambda: list(yaml.load_all(io.BytesIO(export), Loader=yaml.SafeLoader)))
+    _, c_seconds = timed(lambda: list(yaml.load_all(io.BytesIO(export), Loader=YAMLLoader)))
+    flat_file, scan_seconds = timed(lambda: read_yaml(io.BytesIO(export), 'export.yaml', mode='scan'))
+    print(f"  SafeLoader         : {pure_seconds:8.3f}s")
+    print(f"  {YAMLLoader.__name__:<19}: {c_seconds:8.3f}s  ({pure_seconds / c_seconds:.1f}x)")
+    print(f"  read_yaml scan     : {scan_seconds:8.3f}s  ({flat_file.rows_profiled:,} rows, "
+          f"{len(flat_file.columns)} columns)")
+
+if __name__ == "__main__":
+    main()
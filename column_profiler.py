@@ -0,0 +1,270 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Distinct-value profiling for the LookML auto-classifiers. nunique() hashes
+# every value of every column into a hash table; here each column is first
+# judged from a fixed-size row sample, and only columns whose distinct ratio
+# could fall on either side of the classification threshold get a full pass:
+# a HyperLogLog sketch for numeric and date columns, nunique() for the rest,
+# where pandas' factorize is cheaper than hashing every string. 'exact' keeps
+# the nunique() path for every column.
+#
+#   cardinality = profile_cardinality(df)             # auto: sample, then HLL
+#   cardinality['user_id'].ratio, cardinality['user_id'].high
+#   profile_cardinality(df, method='exact')
+#   profile = build_profile(df)                       # everything the LookML widgets read
+
+# ----------------------- Configuration -----------------------
+CARDINALITY_METHODS = ('auto', 'hll', 'exact')
+UNIQUE_RATIO_THRESHOLD = 0.1
+CARDINALITY_SAMPLE_ROWS = 100_000
+SAMPLE_ERROR_SIGMAS = 3         # slack on the sample bounds, in standard deviations of the counts
+HLL_PRECISION = 14              # 16,384 registers, about 0.8% standard error
+HLL_ERROR_SIGMAS = 3            # width of the reported bounds, in standard errors
+DEFAULT_PROFILE_WORKERS = os.cpu_count() or 1
+
+# ----------------------- Helpers -----------------------
+def _by_value(func, series):
+    """Applies func to series; nested JSON values (lists, dicts) cannot be hashed, so they are compared as text."""
+    try:
+        return func(series)
+    except TypeError:
+        return func(series.astype(str))
+
+def _is_numeric_like(series):
+    return pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype)
+
+# ----------------------- HyperLogLog -----------------------
+class HyperLogLog:
+    """Distinct-count sketch over pandas' 64-bit value hashes; sketches of chunks merge losslessly."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = values.dropna()
+        if values.empty:
+            return self
+        if not _is_numeric_like(values):
+            # Duplicates never change the registers, and hashing strings is
+            # the slow part, so only the distinct values are hashed.
+            values = pd.Series(_by_value(pd.Series.unique, values))
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        width = 64 - self.precision
+        buckets = (hashes >> np.uint64(width)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << width) - 1)
+        # frexp's exponent is the bit length (0 for a zero remainder), so the
+        # rank is the position of the first set bit in the remaining width.
+        _, bit_length = np.frexp(remainder.astype(np.float64))
+        ranks = (width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.exp2(-self.registers.astype(np.float64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return raw
+
+# ----------------------- Column Cardinality -----------------------
+class Cardinality(NamedTuple):
+    distinct: float
+    low: float
+    high: float
+    rows: int
+    method: str
+
+    @property
+    def ratio(self):
+        return self.distinct / self.rows if self.rows else 0.0
+
+    @property
+    def ratio_bounds(self):
+        if not self.rows:
+            return 0.0, 0.0
+        return self.low / self.rows, self.high / self.rows
+
+def exact_cardinality(series):
+    distinct = _by_value(pd.Series.nunique, series)
+    return Cardinality(distinct, distinct, distinct, len(series), 'exact')
+
+def hll_cardinality(series, precision=HLL_PRECISION):
+    sketch = HyperLogLog(precision).update(series)
+    estimate = sketch.estimate()
+    margin = HLL_ERROR_SIGMAS * sketch.relative_error * estimate
+    non_null = int(series.notna().sum())
+    return Cardinality(min(estimate, non_null), max(0.0, estimate - margin), min(estimate + margin, non_null),
+                       len(series), 'hll')
+
+def _uniform_distinct(seen, draws):
+    """Distinct count D for which a uniform column shows `seen` distinct values in `draws` rows.
+
+    Solves D * (1 - exp(-draws / D)) = seen for x = draws / D by bisection.
+    Returns inf when seen is (nearly) every draw.
+    """
+    if seen >= draws:
+        return math.inf
+    target = seen / draws
+    low, high = 1e-12, 1.0
+    while (1 - math.exp(-high)) / high > target:
+        high *= 2
+    for _ in range(100):
+        mid = (low + high) / 2
+        if (1 - math.exp(-mid)) / mid > target:
+            low = mid
+        else:
+            high = mid
+    return draws / low
+
+def sample_cardinality(series, positions):
+    """Estimates distinct values from the rows at positions (a uniform sample without replacement).
+
+    The bounds come from the sample's counts, not from the estimate:
+
+    - low: a column with D distinct values shows the most distinct values in
+      a sample when its values are equally frequent, so D is at least the D
+      of a uniform column that would show as many as were seen.
+    - high: every distinct value outside the sample sits in an unsampled row
+      whose value was not seen. The Good-Turing estimate of that share of
+      rows is the fraction of the sample that are singletons.
+
+    Both allow SAMPLE_ERROR_SIGMAS standard deviations of slack. A skewed
+    column (a few heavy values and a long tail of singletons) gets a wide
+    range and is left for a full pass. The estimate is bias-corrected Chao1,
+    clipped to the bounds.
+    """
+    rows = len(series)
+    draws = len(positions)
+    counts = _by_value(pd.Series.value_counts, series.iloc[positions])
+    seen = len(counts)
+    singletons = int((counts == 1).sum())
+    doubletons = int((counts == 2).sum())
+
+    slack = SAMPLE_ERROR_SIGMAS * math.sqrt(seen)
+    low = max(seen, min(rows, _uniform_distinct(max(1.0, seen - slack), draws)))
+    unseen_share = min(1.0, (singletons + SAMPLE_ERROR_SIGMAS * math.sqrt(singletons + 2 * doubletons + 1)) / draws)
+    high = max(low, min(rows, seen + (rows - draws) * unseen_share))
+    chao1 = seen + singletons * (singletons - 1) / (2 * (doubletons + 1))
+    return Cardinality(min(max(chao1, low), high), low, high, rows, 'sample')
+
+def _decided(cardinality, threshold):
+    low, high = cardinality.ratio_bounds
+    return high < threshold or low > threshold
+
+def _profile_column(series, method, positions, threshold):
+    if method == 'exact' or positions is None:
+        return exact_cardinality(series)
+    if method == 'auto':
+        sampled = sample_cardinality(series, positions)
+        if _decided(sampled, threshold):
+            return sampled
+        if not _is_numeric_like(series):
+            return exact_cardinality(series)
+    return hll_cardinality(series)
+
+def profile_cardinality(df, method='auto', sample_rows=CARDINALITY_SAMPLE_ROWS, threshold=UNIQUE_RATIO_THRESHOLD,
+                        max_workers=DEFAULT_PROFILE_WORKERS, seed=0):
+    """Returns {column: Cardinality} for every column of df, profiling columns on a thread pool.
+
+    method is 'auto' (sample first, HLL only when the sample cannot place the
+    ratio on one side of threshold), 'hll' or 'exact' (nunique). Frames no
+    longer than sample_rows are always counted exactly.
+    """
+    if method not in CARDINALITY_METHODS:
+        raise ValueError(f"Unknown cardinality method {method!r}; expected one of {CARDINALITY_METHODS}")
+    positions = None
+    if len(df) > sample_rows:
+        positions = np.sort(np.random.default_rng(seed).choice(len(df), size=sample_rows, replace=False))
+    columns = list(df.columns)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(columns) or 1))) as pool:
+        results = pool.map(lambda col: _profile_column(df[col], method, positions, threshold), columns)
+        return dict(zip(columns, results))
+
+# ----------------------- Dataset Profile -----------------------
+def infer_lookml_type(dtype):
+    """LookML type for a pandas dtype: date, number or string."""
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "date"
+    elif pd.api.types.is_numeric_dtype(dtype):
+        return "number"
+    else:
+        return "string"
+
+def is_date_like(name, dtype):
+    return 'date' in str(name).lower() or pd.api.types.is_datetime64_any_dtype(dtype)
+
+class ColumnProfile(NamedTuple):
+    name: str
+    dtype: str
+    data_type: str
+    distinct: float
+    unique_ratio: float
+    null_rate: float
+    date_like: bool
+
+class DatasetProfile:
+    """Column profiles of one loaded file, in column order."""
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    @property
+    def date_fields(self):
+        return [name for name, column in self.columns.items() if column.date_like]
+
+def build_profile(df, stats=None, method='auto'):
+    """Profiles every column of df once.
+
+    stats maps column names to flat_file_loader ColumnStats. When they carry
+    sketches and cover more rows than df (a file scanned with sketch=True),
+    null rates and distinct counts come from them, so the profile describes the whole file, not just the sample.
+    'exact' always counts df itself; pass every row of the file to get
+    whole-file exact counts.
+    """
+    use_stats = (bool(stats) and method != 'exact'
+                 and all(col in stats and stats[col].sketch is not None for col in df.columns)
+                 and max(column_stats.rows for column_stats in stats.values()) > len(df))
+    cardinality = {} if use_stats else profile_cardinality(df, method=method)
+    rows = max(column_stats.rows for column_stats in stats.values()) if use_stats else len(df)
+    profiles = {}
+    for col in df.columns:
+        series = df[col]
+        if use_stats:
+            distinct, null_rate = stats[col].distinct, stats[col].null_rate
+        else:
+            distinct, null_rate = cardinality[col].distinct, float(series.isna().mean()) if rows else 0.0
+        profiles[col] = ColumnProfile(
+            name=col,
+            dtype=str(series.dtype),
+            data_type=infer_lookml_type(series.dtype),
+            distinct=distinct,
+            unique_ratio=distinct / rows if rows else 0.0,
+            null_rate=null_rate,
+            date_like=is_date_like(col, series.dtype),
+        )
+    return DatasetProfile(rows, profiles)
@@ -0,0 +1,156 @@
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import instrumentation
+from expense_mailer import get_mailer
+from expense_pipeline import (DEFAULT_CACHE_PATH, DEFAULT_MAX_WORKERS, DEFAULT_STORE_PATH, REPORT_MIME_TYPES, ExpenseStore,
+                              ParseCache, ReportWriter, extract_all)
+from expense_sources import S3_MAX_WORKERS, fetch_pdfs_from_s3, iter_local_pdfs, parse_s3_url
+from expense_warehouse import WAREHOUSE_BACKEND, upload_to_snowflake
+
+# Headless entry point for the PDF expense pipeline, for cron jobs and
+# worker boxes. Runs source -> extract -> parse -> clean -> report ->
+# warehouse -> email without Streamlit and prints a JSON run summary.
+#
+#   python expense_batch.py ./receipts --output report.parquet --format parquet
+#   python expense_batch.py s3://expense-bucket/2024/ --incremental --table EXPENSE_REPORTS --email finance@example.com
+
+def run_batch(source, output, fmt='xlsx', workers=DEFAULT_MAX_WORKERS, s3_workers=S3_MAX_WORKERS,
+              cache_path=DEFAULT_CACHE_PATH, incremental=False, store_path=DEFAULT_STORE_PATH,
+              modified_since=None, table=None, backend=WAREHOUSE_BACKEND, emails=()):
+    """Runs the pipeline over a local directory or an s3://bucket/prefix and returns the run summary."""
+    run_started = time.perf_counter()
+    wall_seconds = defaultdict(float)
+    worker_stage_seconds = defaultdict(float)
+    summary = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'source': source,
+        'output': output,
+        'files': 0,
+        'files_parsed': 0,
+        'cache_hits': 0,
+        'rows': 0,
+        'failures': [],
+    }
+
+    recorder = instrumentation.activate(instrumentation.Recorder(f"expense-batch-{summary['started_at']}"))
+    cache = ParseCache(cache_path) if cache_path else None
+    store = None
+    if source.startswith('s3://'):
+        bucket, prefix = parse_s3_url(source)
+        if incremental:
+            store = ExpenseStore(store_path)
+        pdf_files = fetch_pdfs_from_s3(prefix=prefix, bucket=bucket, modified_since=modified_since,
+                                       max_workers=s3_workers, cache=cache, store=store)
+    else:
+        if incremental:
+            raise ValueError("--incremental needs an s3:// source")
+        pdf_files = iter_local_pdfs(source)
+
+    # The warehouse load needs the whole frame for its receipt hashes, so
+    # fragments are only kept when a table was asked for.
+    fragments = []
+    with ReportWriter(output, fmt) as report_writer:
+        extract_started = time.perf_counter()
+        for result in extract_all(pdf_files, max_workers=workers, cache=cache):
+            summary['files'] += 1
+            for stage, seconds in result.timings.items():
+                worker_stage_seconds[stage] += seconds
+            if result.warning:
+                summary['failures'].append({'file': result.file_name, 'warning': result.warning})
+                continue
+            summary['files_parsed'] += 1
+            summary['cache_hits'] += result.cached
+            summary['rows'] += len(result.df)
+
+            write_started = time.perf_counter()
+            if store is not None:
+                store.merge(result.file_name, result.df)
+            else:
+                report_writer.write(result.df)
+                if table:
+                    fragments.append(result.df)
+            wall_seconds['report'] += time.perf_counter() - write_started
+        wall_seconds['ingest_and_extract'] = time.perf_counter() - extract_started - wall_seconds['report']
+
+        write_started = time.perf_counter()
+        if store is not None:
+            for chunk in store.iter_master():
+                report_writer.write(chunk)
+                if table:
+                    fragments.append(chunk)
+    wall_seconds['report'] += time.perf_counter() - write_started
+
+    if table:
+        load_started = time.perf_counter()
+        summary['warehouse_rows_inserted'] = (
+            upload_to_snowflake(pd.concat(fragments, ignore_index=True), table, backend=backend) if fragments else 0
+        )
+        wall_seconds['warehouse'] = time.perf_counter() - load_started
+
+    if emails:
+        email_started = time.perf_counter()
+        mailer = get_mailer()
+        futures = mailer.send("Master Expense Report", "Please find the attached expense report.", list(emails),
+                              output, f"master_expense_report.{fmt}")
+        mailer.close()
+        summary['email_failures'] = [str(future.exception()) for future in futures if future.exception()]
+        wall_seconds['email'] = time.perf_counter() - email_started
+
+    wall_seconds['total'] = time.perf_counter() - run_started
+    summary['wall_seconds'] = {stage: round(seconds, 4) for stage, seconds in wall_seconds.items()}
+    summary['worker_stage_seconds'] = {stage: round(seconds, 4) for stage, seconds in worker_stage_seconds.items()}
+    summary['counters'] = dict(recorder.counters)
+    recorder.flush()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PDF expense pipeline without the Streamlit UI.")
+    parser.add_argument('source', help="directory of PDFs or s3://bucket/prefix")
+    parser.add_argument('--output', help="report path (default: master_expense_report.<format>)")
+    parser.add_argument('--format', default='xlsx', choices=list(REPORT_MIME_TYPES))
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help="extraction processes")
+    parser.add_argument('--s3-workers', type=int, default=S3_MAX_WORKERS, help="concurrent S3 downloads")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="parse cache path")
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--incremental', action='store_true', help="only process new or changed S3 objects")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help="incremental sync store path")
+    parser.add_argument('--since', help="only S3 objects modified on or after this date (YYYY-MM-DD)")
+    parser.add_argument('--table', help="warehouse table to load, e.g. EXPENSE_REPORTS")
+    parser.add_argument('--backend', default=WAREHOUSE_BACKEND, help="warehouse backend (snowflake or duckdb)")
+    parser.add_argument('--email', action='append', default=[], help="report recipient; may be repeated")
+    parser.add_argument('--summary', help="write the JSON run summary here instead of stdout")
+    args = parser.parse_args(argv)
+
+    modified_since = datetime.strptime(args.since, '%Y-%m-%d').replace(tzinfo=timezone.utc) if args.since else None
+    summary = run_batch(
+        args.source,
+        args.output or f"master_expense_report.{args.format}",
+        fmt=args.format,
+        workers=args.workers,
+        s3_workers=args.s3_workers,
+        cache_path=None if args.no_cache else args.cache,
+        incremental=args.incremental,
+        store_path=args.store,
+        modified_since=modified_since,
+        table=args.table,
+        backend=args.backend,
+        emails=args.email,
+    )
+
+    if args.summary:
+        with open(args.summary, 'w') as summary_file:
+            json.dump(summary, summary_file, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
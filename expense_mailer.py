@@ -0,0 +1,176 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from io import BytesIO
+
+# Report delivery over one reused SMTP connection, fed by a background
+# queue so the Streamlit script never waits on the mail server. Point
+# SMTP_HOST/SMTP_PORT at a local server (e.g. aiosmtpd) with
+# SMTP_STARTTLS=0 and no EMAIL_PASSWORD to test without Gmail.
+
+logger = logging.getLogger(__name__)
+
+# ----------------------- Configuration -----------------------
+EMAIL_SENDER = os.getenv('EMAIL_SENDER')
+EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') == '1'
+
+MAIL_MAX_RETRIES = int(os.getenv('MAIL_MAX_RETRIES', '4'))
+MAIL_RETRY_BACKOFF_SECONDS = float(os.getenv('MAIL_RETRY_BACKOFF_SECONDS', '2'))
+# Recipients per message; larger lists are split into several sends.
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', '50'))
+COMPRESS_ATTACHMENTS_ABOVE_BYTES = int(os.getenv('COMPRESS_ATTACHMENTS_ABOVE_BYTES', str(5 * 1024 * 1024)))
+# Formats that are already compressed gain nothing from zipping.
+PRECOMPRESSED_SUFFIXES = ('.xlsx', '.parquet', '.zip', '.gz')
+
+# ----------------------- Message Building -----------------------
+def build_message(subject, body, recipients, attachment_path=None, attachment_name=None,
+                  compress_above=COMPRESS_ATTACHMENTS_ABOVE_BYTES):
+    """Builds the MIME message, zipping the attachment when it is larger than compress_above."""
+    msg = MIMEMultipart()
+    msg['From'] = EMAIL_SENDER
+    msg['To'] = ", ".join(recipients)
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+
+    if attachment_path:
+        attachment_name = attachment_name or os.path.basename(attachment_path)
+        size = os.path.getsize(attachment_path)
+        if size > compress_above and not attachment_name.endswith(PRECOMPRESSED_SUFFIXES):
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.write(attachment_path, arcname=attachment_name)
+            payload = buffer.getvalue()
+            attachment_name += '.zip'
+        else:
+            with open(attachment_path, 'rb') as attachment:
+                payload = attachment.read()
+
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(payload)
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f"attachment; filename={attachment_name}")
+        msg.attach(part)
+
+    return msg
+
+# ----------------------- Mailer -----------------------
+class Mailer:
+    """Delivers queued messages from a background thread over one authenticated connection.
+
+    The connection is checked with NOOP before each send and reopened if the
+    server dropped it. Transient failures (disconnects, 4xx replies) are
+    retried with exponential backoff; permanent 5xx replies fail at once.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, sender=EMAIL_SENDER, password=EMAIL_PASSWORD,
+                 starttls=SMTP_STARTTLS, max_retries=MAIL_MAX_RETRIES, backoff=MAIL_RETRY_BACKOFF_SECONDS):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.starttls = starttls
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._server = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="mailer", daemon=True)
+        self._thread.start()
+
+    def send(self, subject, body, recipients, attachment_path=None, attachment_name=None):
+        """Queues the message and returns one Future per batch of MAIL_BATCH_SIZE recipients.
+
+        The attachment is read when send() is called, so the file may be
+        overwritten as soon as this returns.
+        """
+        futures = []
+        for start in range(0, len(recipients), MAIL_BATCH_SIZE):
+            batch = recipients[start:start + MAIL_BATCH_SIZE]
+            msg = build_message(subject, body, batch, attachment_path, attachment_name)
+            future = Future()
+            self._queue.put((msg.as_string(), batch, future))
+            futures.append(future)
+        return futures
+
+    def _connection(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except smtplib.SMTPException:
+                pass
+            self._disconnect()
+
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.password:
+            server.login(self.sender, self.password)
+        self._server = server
+        return server
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _deliver(self, message, recipients):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connection().sendmail(self.sender, recipients, message)
+                return
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500 or attempt == self.max_retries:
+                    raise
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                if attempt == self.max_retries:
+                    raise
+            self._disconnect()
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._disconnect()
+                return
+            message, recipients, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._deliver(message, recipients)
+                future.set_result(recipients)
+                logger.info("Email sent to %s", ", ".join(recipients))
+            except Exception as e:
+                future.set_exception(e)
+                logger.error("Failed to send email to %s: %s", ", ".join(recipients), e)
+
+    def close(self):
+        """Sends everything still queued, then closes the connection."""
+        self._queue.put(None)
+        self._thread.join()
+
+# One mailer per process, shared by every Streamlit session.
+_mailer = None
+_mailer_lock = threading.Lock()
+
+def get_mailer():
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer()
+        return _mailer
@@ -0,0 +1,757 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional
+
+import fitz  # PyMuPDF
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+import instrumentation
+
+# The parsing stages live here rather than in PDF_to_csv.py so that worker
+# processes can import them without starting the Streamlit app.
+
+# ----------------------- Constants -----------------------
+CATEGORY_KEYWORDS = {
+    'travel': ['flight', 'airfare', 'uber', 'ola', 'taxi', 'train', 'bus', 'hotel'],
+    'food': ['restaurant','swiggy','zomato','doordash', 'dinner', 'lunch', 'breakfast', 'cafe', 'meal', 'food'],
+    'other': []
+}
+
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+
+# Bump whenever a parsing stage changes output, so cached results are re-parsed.
+PARSER_VERSION = "4"
+DEFAULT_CACHE_PATH = "parse_cache.sqlite"
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_STORE_PATH = "expense_store.sqlite"
+
+REPORT_MIME_TYPES = {
+    'xlsx': 'application/vnd.ms-excel',
+    'parquet': 'application/vnd.apache.parquet',
+    'csv': 'text/csv',
+}
+XLSX_MAX_ROWS = 1048576
+
+CATEGORY_DTYPE = pd.CategoricalDtype(list(CATEGORY_KEYWORDS))
+ARROW_STRING_DTYPE = pd.StringDtype('pyarrow')
+
+LINE_ITEM_COLUMNS = ['Date', 'Description', 'Amount']
+# Identifies the receipt a line item came from: its parse cache key (content hash or S3 ETag).
+RECEIPT_KEY_COLUMN = 'Receipt_Key'
+
+PASSENGER_NAME_PATTERN = re.compile(
+    r"(?:Passenger|Guest|Traveller|Traveler|Customer)(?:\s+Name)?\s*[:\-]\s*([A-Za-z][A-Za-z .'\-]*[A-Za-z])",
+    re.IGNORECASE,
+)
+AMOUNT_PATTERN = re.compile(r'^-?(?:[$₹€£]|Rs\.?|INR|USD)?\s?\d[\d,]*\.\d{2}$')
+LINE_ITEM_PATTERN = re.compile(
+    r'^(?:(?P<date>\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4})\s+)?'
+    r'(?P<description>.*?[A-Za-z].*?)\s+'
+    r'(?P<amount>-?(?:[$₹€£]|Rs\.?|INR|USD)?\s?\d[\d,]*\.\d{2})$'
+)
+DATE_PATTERN = re.compile(r'^(?:\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4})$')
+TOTALS_PATTERN = re.compile(r'^(?:sub\s?total|total|grand total|amount due|balance due|tax)\b', re.IGNORECASE)
+FINAL_TOTAL_PATTERN = re.compile(r'^(?:total|grand total|amount due|balance due)\b', re.IGNORECASE)
+FINAL_TOTAL_LABEL_PATTERN = re.compile(r'^(?:total|grand total|amount due|balance due)\s*:?$', re.IGNORECASE)
+
+# Pages read up front to find the passenger and decide the layout.
+SAMPLE_PAGES = 2
+HASH_CHUNK_BYTES = 1024 * 1024
+# Rows per frame when the master table is read back for a report.
+MASTER_CHUNK_ROWS = 100_000
+
+# ----------------------- Lazy Document -----------------------
+class LazyReceipt:
+    """Page-at-a-time view of a PDF receipt.
+
+    pdf is the document's bytes or a path to it on disk. Bytes are read in
+    place; a path is opened by MuPDF, which pulls pages from the file as they
+    are needed instead of holding the document in memory. A page's text
+    blocks are only extracted the first time that page is asked for.
+    """
+
+    def __init__(self, pdf):
+        if isinstance(pdf, (str, os.PathLike)):
+            self.doc = fitz.open(pdf, filetype="pdf")
+        else:
+            self.doc = fitz.open(stream=pdf, filetype="pdf")
+        self.page_count = self.doc.page_count
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def page_blocks(self, number):
+        """Returns the page's text blocks as (x0, y0, x1, y1, text), in reading order."""
+        if number not in self._blocks:
+            blocks = self.doc[number].get_text("blocks", sort=True)
+            self._blocks[number] = [block[:5] for block in blocks if block[6] == 0]
+        return self._blocks[number]
+
+    @property
+    def pages_read(self):
+        """Number of pages whose text has been extracted so far."""
+        return len(self._blocks)
+
+    def page_text(self, number):
+        return "\n".join(block[4].rstrip() for block in self.page_blocks(number))
+
+    def sample_text(self, pages=SAMPLE_PAGES):
+        """Returns the text of the first few pages, enough to classify the receipt."""
+        return "\n".join(self.page_text(number) for number in range(min(pages, self.page_count)))
+
+    def text_until_totals(self):
+        """Returns the text up to and including the final totals line, reading
+        no further pages once it has been found.
+
+        The final totals line is a total label with its amount, either inline
+        ("Total 300.00") or in the next table cell, after at least one line
+        item. Header lines such as "Total Nights: 3" do not end the read.
+        """
+        lines = []
+        items_seen = False
+        previous = ""
+        for number in range(self.page_count):
+            for line in self.page_text(number).splitlines():
+                lines.append(line)
+                line = line.strip()
+                if not line:
+                    continue
+                if AMOUNT_PATTERN.match(line):
+                    if items_seen and FINAL_TOTAL_LABEL_PATTERN.match(previous):
+                        return "\n".join(lines)
+                    # In a table the amount cell follows its description cell.
+                    if previous and not AMOUNT_PATTERN.match(previous) and not TOTALS_PATTERN.match(previous):
+                        items_seen = True
+                else:
+                    match = LINE_ITEM_PATTERN.match(line)
+                    if match and FINAL_TOTAL_PATTERN.match(line):
+                        if items_seen:
+                            return "\n".join(lines)
+                    elif match and not TOTALS_PATTERN.match(match.group('description')):
+                        items_seen = True
+                previous = line
+        return "\n".join(lines)
+
+    def close(self):
+        self.doc.close()
+
+# ----------------------- Parsing Stages -----------------------
+def extract_text_from_pdf(pdf_bytes):
+    """Returns the text of every page in the PDF, or an empty string if it cannot be read."""
+    try:
+        with LazyReceipt(pdf_bytes) as receipt:
+            return "\n".join(receipt.page_text(number) for number in range(receipt.page_count))
+    except Exception:
+        return ""
+
+def extract_passenger_name(text):
+    match = PASSENGER_NAME_PATTERN.search(text)
+    return match.group(1).strip() if match else "Unknown"
+
+def analyze_pdf_complexity(text):
+    """Classifies a receipt as 'simple' (description and amount on one line) or 'complex' (tabular layout)."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    inline_items = sum(1 for line in lines if LINE_ITEM_PATTERN.match(line))
+    bare_amounts = sum(1 for line in lines if AMOUNT_PATTERN.match(line))
+    return "complex" if bare_amounts > inline_items else "simple"
+
+def parse_text_to_dataframe(text, complexity):
+    """Parses receipt text into Date / Description / Amount line items."""
+    rows = []
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+    if complexity == "simple":
+        for line in lines:
+            match = LINE_ITEM_PATTERN.match(line)
+            if match and not TOTALS_PATTERN.match(match.group('description')):
+                rows.append([match.group('date'), match.group('description'), match.group('amount')])
+    else:
+        # Table cells come out of PyMuPDF one per line, so collect the cells
+        # preceding each amount into a single line item. A date cell starts
+        # a new row, which also drops any header text above the table.
+        date, description = None, []
+        for line in lines:
+            if DATE_PATTERN.match(line):
+                date, description = line, []
+            elif AMOUNT_PATTERN.match(line):
+                text_cells = " ".join(description)
+                if text_cells and not TOTALS_PATTERN.match(text_cells):
+                    rows.append([date, text_cells, line])
+                date, description = None, []
+            else:
+                description.append(line)
+
+    return pd.DataFrame(rows, columns=LINE_ITEM_COLUMNS)
+
+def clean_dataframe(df):
+    """Normalizes parsed line items: numeric amounts, parsed dates and an expense category."""
+    df = df.copy()
+    df['Description'] = df['Description'].str.strip()
+    df['Amount'] = pd.to_numeric(df['Amount'].str.replace(r'[^0-9.\-]', '', regex=True), errors='coerce')
+    df = df.dropna(subset=['Amount'])
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df['Category'] = CATEGORIZER.categorize(df['Description'])
+    return df.reset_index(drop=True)
+
+# ----------------------- Categorization -----------------------
+def _trie_pattern(words):
+    """Builds a prefix-factored alternation (e.g. 'ta(?:xi|b)') so the regex engine
+    never retries a shared prefix once per keyword."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        ends_here = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if ends_here else body
+
+    return build(trie)
+
+class KeywordCategorizer:
+    """Categorizes descriptions against a keyword table compiled into one regex.
+
+    Keywords match whole words (plus a plural 's'), case-insensitively. A
+    keyword may be listed under several categories. When a description hits
+    more than one category, the one earliest in `priority` (by default the
+    order of category_keywords) is its primary category.
+    """
+
+    def __init__(self, category_keywords=CATEGORY_KEYWORDS, priority=None, default='other'):
+        self.default = default
+        self.priority = {category: rank for rank, category in enumerate(priority or category_keywords)}
+        self.keyword_categories = {}
+        for category, keywords in category_keywords.items():
+            for keyword in keywords:
+                self.keyword_categories.setdefault(keyword.lower(), []).append(category)
+        if self.keyword_categories:
+            self.pattern = re.compile(r'\b(' + _trie_pattern(self.keyword_categories) + r')s?\b')
+        else:
+            self.pattern = re.compile(r'(?!)')
+
+    def _matched_categories(self, descriptions):
+        """Returns one row per (description index, matched category)."""
+        keywords = descriptions.fillna('').str.lower().str.findall(self.pattern).explode()
+        categories = keywords.map(self.keyword_categories).explode().dropna()
+        categories = categories.to_frame('category').reset_index(names='row').drop_duplicates()
+        categories['rank'] = categories['category'].map(self.priority).fillna(len(self.priority))
+        return categories
+
+    def categorize(self, descriptions):
+        """Returns the primary category of each description in a Series."""
+        categories = self._matched_categories(descriptions)
+        primary = categories.sort_values(['row', 'rank']).drop_duplicates('row').set_index('row')['category']
+        return primary.reindex(descriptions.index).fillna(self.default)
+
+    def categorize_all(self, descriptions, sep='|'):
+        """Returns every matched category of each description, in priority order, joined by sep."""
+        categories = self._matched_categories(descriptions).sort_values(['row', 'rank'])
+        joined = categories.groupby('row')['category'].agg(sep.join)
+        return joined.reindex(descriptions.index).fillna(self.default)
+
+CATEGORIZER = KeywordCategorizer()
+
+# ----------------------- Parse Cache -----------------------
+def content_cache_key(pdf):
+    """Keys a PDF by the hash of its content; pdf is bytes or a path, which is hashed in chunks."""
+    if isinstance(pdf, (str, os.PathLike)):
+        digest = hashlib.sha256()
+        with open(pdf, 'rb') as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        return "sha256:" + digest.hexdigest()
+    return "sha256:" + hashlib.sha256(pdf).hexdigest()
+
+def etag_cache_key(bucket, etag):
+    etag = etag.strip('"')
+    return f"etag:{bucket}:{etag}"
+
+class ParseCache:
+    """On-disk SQLite cache of parsed line items, keyed by PDF content hash or S3 ETag.
+
+    Entries written by a different PARSER_VERSION are dropped on open, and the
+    least recently used entries are evicted once the stored line items exceed
+    max_bytes. One connection may be shared across threads: every statement
+    and its commit run under a lock.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS parse_cache (
+                cache_key TEXT PRIMARY KEY,
+                parser_version TEXT NOT NULL,
+                passenger_name TEXT,
+                line_items BLOB NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS parse_cache_last_used ON parse_cache (last_used)")
+        self.conn.execute("DELETE FROM parse_cache WHERE parser_version != ?", (PARSER_VERSION,))
+        self.conn.commit()
+
+    def __contains__(self, cache_key):
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM parse_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        return row is not None
+
+    def get(self, cache_key):
+        """Returns the cached DataFrame (with Passenger_Name) or None on a miss."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT passenger_name, line_items FROM parse_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE parse_cache SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+            self.conn.commit()
+        passenger_name, line_items = row
+        df = pd.read_parquet(BytesIO(line_items))
+        df['Passenger_Name'] = passenger_name
+        return df
+
+    def put(self, cache_key, df):
+        passenger_name = df['Passenger_Name'].iloc[0] if len(df) else None
+        buffer = BytesIO()
+        df.drop(columns=['Passenger_Name']).to_parquet(buffer, index=False)
+        line_items = buffer.getvalue()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, PARSER_VERSION, passenger_name, line_items, len(line_items), time.time()),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM parse_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale_keys = []
+        for cache_key, size_bytes in self.conn.execute(
+            "SELECT cache_key, size_bytes FROM parse_cache ORDER BY last_used"
+        ):
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((cache_key,))
+            total -= size_bytes
+        self.conn.executemany("DELETE FROM parse_cache WHERE cache_key = ?", stale_keys)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+# ----------------------- Incremental Sync -----------------------
+class ExpenseStore:
+    """Persisted master expense table plus a manifest of the S3 objects merged into it.
+
+    needs_sync is called while listing the bucket and stages any object whose
+    ETag or LastModified differs from the manifest; merge then replaces that
+    object's rows in the master table and records it as processed. Objects
+    that fail to parse are never merged, so the next sync retries them.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed_objects (
+                object_key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                last_modified TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.staged = {}
+
+    def needs_sync(self, obj):
+        """Takes a list_objects_v2 entry and returns True if it is new or changed."""
+        version = (obj['ETag'], obj['LastModified'].isoformat())
+        row = self.conn.execute(
+            "SELECT etag, last_modified FROM processed_objects WHERE object_key = ?", (obj['Key'],)
+        ).fetchone()
+        if row is not None and tuple(row) == version:
+            return False
+        self.staged[obj['Key']] = version
+        return True
+
+    def _has_master_table(self):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'master_expenses'"
+        ).fetchone()
+        return row is not None
+
+    def merge(self, object_key, df):
+        etag, last_modified = self.staged.pop(object_key)
+        if self._has_master_table():
+            self.conn.execute("DELETE FROM master_expenses WHERE Source_Key = ?", (object_key,))
+            self._add_missing_columns(df)
+        df.assign(Source_Key=object_key).to_sql('master_expenses', self.conn, if_exists='append', index=False)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO processed_objects VALUES (?, ?, ?, ?)",
+            (object_key, etag, last_modified, time.time()),
+        )
+        self.conn.commit()
+
+    def _add_missing_columns(self, df):
+        """Adds columns that df has and an older master table lacks, e.g. Receipt_Key."""
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(master_expenses)")}
+        for col in df.columns:
+            if col not in existing:
+                self.conn.execute(f'ALTER TABLE master_expenses ADD COLUMN "{col}"')
+
+    def iter_master(self, chunk_rows=MASTER_CHUNK_ROWS):
+        """Yields the master table in frames of up to chunk_rows rows. Rows merged
+        before receipts carried a Receipt_Key are identified by their Source_Key instead."""
+        if not self._has_master_table():
+            return
+        for df in pd.read_sql("SELECT * FROM master_expenses", self.conn, parse_dates=['Date'], chunksize=chunk_rows):
+            if RECEIPT_KEY_COLUMN in df:
+                df[RECEIPT_KEY_COLUMN] = df[RECEIPT_KEY_COLUMN].fillna(df['Source_Key'])
+            yield df
+
+    def close(self):
+        self.conn.close()
+
+# ----------------------- Compact Frame -----------------------
+def compact_frame(df):
+    """Returns df with compact dtypes: categoricals for Category and Passenger_Name,
+    Arrow-backed strings for Description, Source_Key and Receipt_Key, and the smallest
+    integer type for integer columns. Safe to call again on a compacted frame.
+
+    Amount stays float64: float32 cannot hold cents exactly (23.40 would be
+    exported as 23.399999618530273).
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    if 'Category' in df:
+        df['Category'] = df['Category'].astype(CATEGORY_DTYPE)
+    if 'Passenger_Name' in df:
+        df['Passenger_Name'] = df['Passenger_Name'].astype('category')
+    for col in ('Description', 'Source_Key', RECEIPT_KEY_COLUMN):
+        if col in df:
+            df[col] = df[col].astype(ARROW_STRING_DTYPE)
+    for col in df.select_dtypes('integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+class ExpenseSummary:
+    """Running summary of the master frame, updated as each fragment arrives.
+
+    Holds totals, amount range, date range and per-passenger category counts,
+    so the preview never has to scan (or describe) the full master frame.
+    """
+
+    def __init__(self):
+        self.line_items = 0
+        self.amount_total = 0.0
+        self.amount_min = None
+        self.amount_max = None
+        self.date_min = None
+        self.date_max = None
+        self._passengers = {}
+
+    def update(self, df):
+        if df.empty:
+            return
+        self.line_items += len(df)
+        amounts = df['Amount'].astype('float64')
+        self.amount_total += float(amounts.sum())
+        self.amount_min = _fold(min, self.amount_min, amounts.min())
+        self.amount_max = _fold(max, self.amount_max, amounts.max())
+        self.date_min = _fold(min, self.date_min, df['Date'].min())
+        self.date_max = _fold(max, self.date_max, df['Date'].max())
+
+        grouped = amounts.groupby([df['Passenger_Name'], df['Category']], observed=True).agg(['count', 'sum'])
+        for (passenger, category), (count, total) in grouped.iterrows():
+            stats = self._passengers.setdefault(passenger, {'line_items': 0, 'amount': 0.0, 'categories': {}})
+            stats['line_items'] += int(count)
+            stats['amount'] += float(total)
+            stats['categories'][category] = stats['categories'].get(category, 0) + int(count)
+
+    def overview(self):
+        return pd.DataFrame({
+            'value': [
+                self.line_items, len(self._passengers), round(self.amount_total, 2),
+                self.amount_min, self.amount_max, self.date_min, self.date_max,
+            ]
+        }, index=['line items', 'passengers', 'total amount', 'min amount', 'max amount',
+                  'first date', 'last date']).astype(str)
+
+    def by_passenger(self, top_categories=3):
+        rows = []
+        for passenger, stats in self._passengers.items():
+            categories = sorted(stats['categories'].items(), key=lambda item: -item[1])[:top_categories]
+            rows.append({
+                'Passenger_Name': passenger,
+                'Line Items': stats['line_items'],
+                'Total Amount': round(stats['amount'], 2),
+                'Top Categories': ", ".join(f"{category} ({count})" for category, count in categories),
+            })
+        columns = ['Passenger_Name', 'Line Items', 'Total Amount', 'Top Categories']
+        return pd.DataFrame(rows, columns=columns).sort_values('Total Amount', ascending=False, ignore_index=True)
+
+def _fold(func, current, value):
+    if pd.isna(value):
+        return current
+    return value if current is None else func(current, value)
+
+# ----------------------- Report Writer -----------------------
+class ReportWriter:
+    """Streams DataFrame fragments into an xlsx, Parquet or CSV report on disk.
+
+    Each write() appends rows and lets them go: xlsx is written by xlsxwriter
+    in constant_memory mode, Parquet as one row group per fragment, and CSV by
+    plain appends. The columns of the first fragment fix the report layout.
+    Empty fragments are skipped: their columns carry no types, so the file
+    (and the Parquet schema) is opened by the first fragment with rows.
+    """
+
+    def __init__(self, path, fmt='xlsx'):
+        if fmt not in REPORT_MIME_TYPES:
+            raise ValueError(f"Unsupported report format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.columns = None
+        self.rows_written = 0
+        self._opened = False
+        self._workbook = None
+        self._worksheet = None
+        self._sheet_row = 0
+        self._parquet_writer = None
+        self._csv_file = None
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @instrumentation.traced('report.write')
+    def write(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        if df.empty:
+            return
+        df = df.reindex(columns=self.columns)
+        if not self._opened:
+            self._open(df)
+            self._opened = True
+
+        if self.fmt == 'xlsx':
+            self._write_xlsx(df)
+        elif self.fmt == 'parquet':
+            table = pa.Table.from_pandas(df, schema=self._parquet_writer.schema, preserve_index=False)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(self._csv_file, header=False, index=False)
+        self.rows_written += len(df)
+
+    def _open(self, df):
+        if self.fmt == 'xlsx':
+            self._workbook = xlsxwriter.Workbook(
+                self.path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'}
+            )
+        elif self.fmt == 'parquet':
+            self._parquet_writer = pq.ParquetWriter(self.path, pa.Schema.from_pandas(df, preserve_index=False))
+        else:
+            self._csv_file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._csv_file.write(pd.DataFrame(columns=self.columns).to_csv(index=False))
+
+    def _new_sheet(self):
+        self._worksheet = self._workbook.add_worksheet()
+        self._worksheet.write_row(0, 0, self.columns)
+        self._sheet_row = 1
+
+    def _write_xlsx(self, df):
+        for row in df.itertuples(index=False, name=None):
+            if self._worksheet is None or self._sheet_row >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            for col, value in enumerate(row):
+                if not pd.isna(value):
+                    self._worksheet.write(self._sheet_row, col, value)
+            self._sheet_row += 1
+
+    def close(self):
+        """Finishes the file, producing an empty report if nothing was written."""
+        if self._closed:
+            return
+        self._closed = True
+        if self.fmt == 'xlsx':
+            if self._workbook is None:
+                self._workbook = xlsxwriter.Workbook(self.path)
+            if self._worksheet is None:
+                self._worksheet = self._workbook.add_worksheet()
+                if self.columns:
+                    self._worksheet.write_row(0, 0, self.columns)
+            self._workbook.close()
+        elif self.fmt == 'parquet':
+            if self._parquet_writer is None:
+                pq.write_table(pa.table({}), self.path)
+            else:
+                self._parquet_writer.close()
+        else:
+            if self._csv_file is None:
+                pd.DataFrame(columns=self.columns or []).to_csv(self.path, index=False)
+            else:
+                self._csv_file.close()
+
+# ----------------------- Extraction Engine -----------------------
+class ExtractResult(NamedTuple):
+    file_name: str
+    df: Optional[pd.DataFrame]
+    warning: Optional[str]
+    timings: Dict[str, float]
+    cached: bool = False
+    pages: int = 0
+
+def process_pdf(file_name, pdf_bytes):
+    """Runs every parsing stage on one PDF and returns an ExtractResult.
+
+    timings holds the seconds spent in each stage (extract, analyze, parse,
+    clean) so callers can see where a slow batch went; pages is the number of
+    pages whose text was read.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = now - started
+        started = now
+
+    try:
+        try:
+            receipt = LazyReceipt(pdf_bytes)
+        except Exception:
+            return ExtractResult(file_name, None, f"Failed to extract text from {file_name}", timings)
+
+        with receipt:
+            # Only the first pages decide the layout; the rest are read on
+            # demand and reading stops at the totals section.
+            sample = receipt.sample_text()
+            text = receipt.text_until_totals()
+            pages = receipt.pages_read
+        lap('extract')
+        if not text.strip():
+            return ExtractResult(file_name, None, f"Failed to extract text from {file_name}", timings, pages=pages)
+
+        passenger_name = extract_passenger_name(sample)
+        complexity = analyze_pdf_complexity(sample)
+        lap('analyze')
+        df = parse_text_to_dataframe(text, complexity)
+        lap('parse')
+        df = clean_dataframe(df)
+        df['Passenger_Name'] = passenger_name
+        lap('clean')
+        if df.empty:
+            return ExtractResult(file_name, None, f"No line items found in {file_name}", timings, pages=pages)
+        return ExtractResult(file_name, df, None, timings, pages=pages)
+    except Exception as e:
+        return ExtractResult(file_name, None, f"Failed to parse {file_name}: {e}", timings)
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def extract_all(pdf_files, max_workers=DEFAULT_MAX_WORKERS, cache=None):
+    """Yields an ExtractResult for each PDF in pdf_files, in input order.
+
+    Items are (file_name, pdf_bytes) or (file_name, pdf_bytes, cache_key),
+    where pdf_bytes may also be a path to the PDF on disk; workers then open
+    the file themselves and only the path crosses the process boundary. A
+    source that already knows an object is cached (see fetch_pdfs_from_s3)
+    passes pdf_bytes=None with its cache key. Cache hits are answered without
+    touching the pool; misses are parsed across a process pool and stored.
+    Every result's rows carry the cache key as their Receipt_Key.
+    Only 2 * max_workers files are submitted ahead of the consumer, so a lazy
+    source is never drained into memory up front.
+    """
+    if max_workers > 1:
+        # Spawn rather than fork: the Streamlit server and the S3 download pool
+        # are multithreaded, and forking them can deadlock the children.
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+    else:
+        executor = None
+
+    def submit(file_name, pdf_bytes):
+        if executor is None:
+            return _completed(process_pdf(file_name, pdf_bytes))
+        return executor.submit(process_pdf, file_name, pdf_bytes)
+
+    def collect(receipt_key, store, future):
+        result = future.result()
+        if store and cache is not None and result.df is not None:
+            cache.put(receipt_key, result.df)
+        if result.df is not None:
+            result.df[RECEIPT_KEY_COLUMN] = receipt_key
+        # Stage timings are measured in the worker, so they are recorded here
+        # against the caller's recorder.
+        for stage, seconds in result.timings.items():
+            instrumentation.observe(f"pdf.{stage}", seconds)
+        instrumentation.count('pdf.files')
+        instrumentation.count('pdf.pages_parsed', result.pages)
+        instrumentation.count('pdf.cache_hits', result.cached)
+        instrumentation.count('pdf.failures', result.warning is not None)
+        instrumentation.count('pdf.rows', 0 if result.df is None else len(result.df))
+        return result
+
+    try:
+        pending = deque()
+        for item in pdf_files:
+            file_name, pdf_bytes = item[0], item[1]
+            cache_key = item[2] if len(item) > 2 else None
+            # The cache key doubles as the receipt's identity in the master
+            # table, so it is computed even when there is no cache.
+            if cache_key is None:
+                cache_key = content_cache_key(pdf_bytes)
+            if cache is None:
+                pending.append((cache_key, False, submit(file_name, pdf_bytes)))
+            else:
+                df = cache.get(cache_key)
+                if df is not None:
+                    result = ExtractResult(file_name, df, None, {}, cached=True)
+                    pending.append((cache_key, False, _completed(result)))
+                elif pdf_bytes is None:
+                    warning = f"{file_name} dropped out of the parse cache; fetch it again"
+                    pending.append((cache_key, False, _completed(ExtractResult(file_name, None, warning, {}))))
+                else:
+                    pending.append((cache_key, True, submit(file_name, pdf_bytes)))
+            if len(pending) >= max_workers * 2:
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
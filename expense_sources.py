@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import boto3
+
+import instrumentation
+from expense_pipeline import etag_cache_key
+
+# PDF sources for the expense pipeline. Each yields (name, pdf) or
+# (name, pdf, cache_key) lazily, one document at a time, in the form
+# extract_all consumes; pdf is the document's bytes or a path to it.
+
+# ----------------------- Configuration -----------------------
+AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY')
+AWS_SECRET_KEY = os.getenv('AWS_SECRET_KEY')
+S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
+S3_PREFIX = os.getenv('S3_PREFIX', '')
+S3_MAX_WORKERS = int(os.getenv('S3_MAX_WORKERS', '8'))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+# ----------------------- Local Directory -----------------------
+def iter_local_pdfs(directory):
+    """Yields (relative path, path) for every PDF under directory, in sorted order.
+
+    Files are not read here; the extraction workers open them by path.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            if not file_name.lower().endswith('.pdf'):
+                continue
+            path = os.path.join(root, file_name)
+            yield os.path.relpath(path, directory), path
+
+# ----------------------- Uploads -----------------------
+def spool_upload(upload, directory):
+    """Copies a file-like upload into a new file under directory, one chunk at a time, and returns its path."""
+    upload.seek(0)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.pdf', delete=False) as spooled:
+        shutil.copyfileobj(upload, spooled, SPOOL_CHUNK_BYTES)
+    instrumentation.count('upload.bytes_spooled', os.path.getsize(spooled.name))
+    return spooled.name
+
+def spool_uploads(uploads, directory):
+    """Yields (name, path) for each upload, spooling each only when the consumer asks for it."""
+    for upload in uploads:
+        yield upload.name, spool_upload(upload, directory)
+
+# ----------------------- S3 Bucket -----------------------
+def parse_s3_url(url):
+    """Splits 's3://bucket/prefix' into (bucket, prefix)."""
+    bucket, _, prefix = url[len('s3://'):].partition('/')
+    return bucket, prefix
+
+def list_pdf_objects(s3, prefix='', modified_since=None, modified_until=None, bucket=None):
+    """Yields every PDF object under the prefix, following list_objects_v2 pagination."""
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket or S3_BUCKET_NAME, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if not obj['Key'].endswith('.pdf'):
+                continue
+            if modified_since and obj['LastModified'] < modified_since:
+                continue
+            if modified_until and obj['LastModified'] >= modified_until:
+                continue
+            yield obj
+
+def create_s3_client():
+    return boto3.client('s3', aws_access_key_id=AWS_ACCESS_KEY, aws_secret_access_key=AWS_SECRET_KEY)
+
+def download_pdf(s3, bucket, key, cache_key):
+    with instrumentation.span('s3.download'):
+        pdf_obj = s3.get_object(Bucket=bucket, Key=key)
+        pdf_bytes = pdf_obj['Body'].read()
+    instrumentation.count('s3.bytes_downloaded', len(pdf_bytes))
+    return key, pdf_bytes, cache_key
+
+def fetch_pdfs_from_s3(prefix=S3_PREFIX, modified_since=None, modified_until=None, max_workers=S3_MAX_WORKERS,
+                       cache=None, store=None, bucket=None, s3=None):
+    """Yields (key, bytes, cache_key) for each PDF in the bucket as soon as its download finishes.
+
+    At most 2 * max_workers downloads are in flight or waiting to be consumed,
+    so memory stays bounded no matter how many objects the bucket holds.
+    Objects whose ETag is already in the parse cache are not downloaded and
+    are yielded with bytes=None. With an ExpenseStore, objects already merged
+    at their current ETag/LastModified are skipped entirely. Pass an existing
+    client as s3 to reuse its connection pool across calls.
+    """
+    bucket = bucket or S3_BUCKET_NAME
+    s3 = s3 or create_s3_client()
+    max_pending = max_workers * 2
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for obj in list_pdf_objects(s3, prefix, modified_since, modified_until, bucket):
+            instrumentation.count('s3.objects_listed')
+            if store is not None and not store.needs_sync(obj):
+                instrumentation.count('s3.unchanged_skipped')
+                continue
+            cache_key = etag_cache_key(bucket, obj['ETag'])
+            if cache is not None and cache_key in cache:
+                instrumentation.count('s3.download_skipped_cached')
+                yield obj['Key'], None, cache_key
+                continue
+            pending.add(executor.submit(instrumentation.bind(download_pdf), s3, bucket, obj['Key'], cache_key))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
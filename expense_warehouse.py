@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+import instrumentation
+from expense_pipeline import RECEIPT_KEY_COLUMN
+
+# Bulk loading of the master expense table. Snowflake is the production
+# backend; DuckDB stands in for it so loads can be tested and benchmarked
+# offline (WAREHOUSE_BACKEND=duckdb).
+
+# ----------------------- Configuration -----------------------
+SNOWFLAKE_CONFIG = {
+    'user': os.getenv('SNOWFLAKE_USER'),
+    'password': os.getenv('SNOWFLAKE_PASSWORD'),
+    'account': os.getenv('SNOWFLAKE_ACCOUNT'),
+    'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE'),
+    'database': os.getenv('SNOWFLAKE_DATABASE'),
+    'schema': os.getenv('SNOWFLAKE_SCHEMA')
+}
+
+WAREHOUSE_BACKEND = os.getenv('WAREHOUSE_BACKEND', 'snowflake')
+DUCKDB_PATH = os.getenv('DUCKDB_PATH', 'expense_warehouse.duckdb')
+
+RECEIPT_HASH_COLUMN = 'RECEIPT_HASH'
+DEFAULT_CHUNK_ROWS = 100000
+
+# ----------------------- Helpers -----------------------
+def add_receipt_hash(df):
+    """Adds a RECEIPT_HASH column identifying each line item by its receipt and content.
+
+    The hash covers every column, including the Receipt_Key that extract_all
+    stamps on each receipt's rows, so equal line items on two different
+    receipts never share a hash. Identical rows within one receipt are told
+    apart by their occurrence number, so two equal line items stay two rows
+    while a re-upload of the receipt matches both. Columns are hashed in a
+    canonical dtype (float64, plain objects), so a compacted frame hashes the
+    same as the frame it was compacted from.
+    """
+    if RECEIPT_KEY_COLUMN not in df:
+        raise ValueError(f"Cannot tell receipts apart without a {RECEIPT_KEY_COLUMN} column")
+    canonical = df.copy()
+    for col in canonical.columns:
+        dtype = canonical[col].dtype
+        if pd.api.types.is_float_dtype(dtype):
+            canonical[col] = canonical[col].astype('float64')
+        elif isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            canonical[col] = canonical[col].astype(object)
+    row_hash = pd.util.hash_pandas_object(canonical, index=False)
+    occurrence = row_hash.groupby([canonical[RECEIPT_KEY_COLUMN], row_hash]).cumcount()
+    df = df.copy()
+    df[RECEIPT_HASH_COLUMN] = row_hash.astype(str) + '-' + occurrence.astype(str)
+    return df
+
+def stage_parquet_chunks(df, directory, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Writes df as snappy-compressed Parquet files of at most chunk_rows rows each."""
+    paths = []
+    for number, start in enumerate(range(0, len(df), chunk_rows)):
+        path = os.path.join(directory, f"chunk_{number:05d}.parquet")
+        df.iloc[start:start + chunk_rows].to_parquet(path, index=False, compression='snappy')
+        paths.append(path)
+    return paths
+
+# ----------------------- Backends -----------------------
+class SnowflakeLoader:
+    """Loads through write_pandas (Parquet chunks, PUT and COPY INTO) into a temporary
+    stage table, then MERGEs new receipt hashes into the target table."""
+
+    def __init__(self, config=SNOWFLAKE_CONFIG):
+        import snowflake.connector
+
+        self.conn = snowflake.connector.connect(**config)
+
+    def load(self, df, table_name, chunk_rows=DEFAULT_CHUNK_ROWS):
+        from snowflake.connector.pandas_tools import write_pandas
+
+        stage_table = f"{table_name}_STAGE"
+        write_pandas(
+            self.conn, df, stage_table,
+            chunk_size=chunk_rows,
+            compression='snappy',
+            auto_create_table=True,
+            overwrite=True,
+            table_type='temporary',
+            use_logical_type=True,
+        )
+        columns = ", ".join(f'"{col}"' for col in df.columns)
+        values = ", ".join(f's."{col}"' for col in df.columns)
+        with self.conn.cursor() as cur:
+            cur.execute(f'CREATE TABLE IF NOT EXISTS {table_name} LIKE "{stage_table}"')
+            cur.execute(
+                f'MERGE INTO {table_name} t USING "{stage_table}" s '
+                f'ON t."{RECEIPT_HASH_COLUMN}" = s."{RECEIPT_HASH_COLUMN}" '
+                f'WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values})'
+            )
+            inserted = cur.fetchone()[0]
+            cur.execute(f'DROP TABLE IF EXISTS "{stage_table}"')
+        return inserted
+
+class DuckDBLoader:
+    """Offline stand-in for SnowflakeLoader: stages the same Parquet chunks on local
+    disk, copies them into a temporary table and inserts unseen receipt hashes."""
+
+    def __init__(self, path=DUCKDB_PATH):
+        import duckdb
+
+        self.conn = duckdb.connect(path)
+
+    def load(self, df, table_name, chunk_rows=DEFAULT_CHUNK_ROWS):
+        stage_table = f"{table_name}_STAGE"
+        with tempfile.TemporaryDirectory() as stage_dir:
+            stage_parquet_chunks(df, stage_dir, chunk_rows)
+            files = os.path.join(stage_dir, '*.parquet')
+            self.conn.execute(f"CREATE OR REPLACE TEMP TABLE {stage_table} AS SELECT * FROM read_parquet('{files}')")
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM {stage_table} LIMIT 0")
+        inserted = self.conn.execute(
+            f"INSERT INTO {table_name} BY NAME SELECT * FROM {stage_table} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table_name} t WHERE t.{RECEIPT_HASH_COLUMN} = s.{RECEIPT_HASH_COLUMN})"
+        ).fetchone()[0]
+        self.conn.execute(f"DROP TABLE {stage_table}")
+        return inserted
+
+LOADER_BACKENDS = {
+    'snowflake': SnowflakeLoader,
+    'duckdb': DuckDBLoader,
+}
+
+# ----------------------- Connection Pool -----------------------
+# One loader (and so one open connection) per backend per process, reused
+# across Streamlit reruns and sessions; the lock serializes loads on it.
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+def get_loader(backend=WAREHOUSE_BACKEND):
+    with _loaders_lock:
+        if backend not in _loaders:
+            _loaders[backend] = LOADER_BACKENDS[backend]()
+        return _loaders[backend]
+
+def upload_to_snowflake(df, table_name, backend=WAREHOUSE_BACKEND, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Bulk-loads df into table_name and returns the number of new rows.
+
+    Rows whose receipt hash is already in the table are skipped, so uploading
+    the same report twice does not duplicate it.
+    """
+    if df.empty:
+        return 0
+    with instrumentation.span('warehouse.upload', backend=backend, table=table_name):
+        loader = get_loader(backend)
+        with _loaders_lock:
+            inserted = loader.load(add_receipt_hash(df), table_name, chunk_rows)
+    instrumentation.count('warehouse.rows_staged', len(df))
+    instrumentation.count('warehouse.rows_inserted', inserted)
+    return inserted
@@ -0,0 +1,347 @@
+import hashlib
+import os
+from itertools import islice
+
+import ijson
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import yaml
+
+from column_profiler import HyperLogLog
+
+try:
+    from yaml import CSafeLoader as YAMLLoader  # libyaml bindings
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+# Flat-file ingestion for the LookML apps. A file is read into a FlatFile:
+# a bounded sample frame for the preview and the column widgets, running
+# per-column statistics folded in one chunk at a time, and the full frame,
+# which is only read when frame() is called.
+#
+#   flat_file = read_csv(upload, mode='scan')
+#   flat_file = read_json(upload, record_path='data.results', max_depth=1)
+#   flat_file = read_yaml(upload, mode='scan')
+#   flat_file.sample.head()
+#   flat_file.stats['amount'].null_rate
+#   read_csv(upload, mode='scan', sketch=True).stats['user_id'].distinct
+#   flat_file.frame()  # materializes the whole file
+
+# ----------------------- Configuration -----------------------
+SAMPLE_ROWS = int(os.getenv('FLAT_FILE_SAMPLE_ROWS', '50000'))
+CSV_BLOCK_BYTES = 8 * 1024 * 1024
+CSV_FALLBACK_CHUNK_ROWS = 100_000
+RECORD_BATCH_ROWS = 10_000
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+JSON_EXTENSIONS = ('.json',) + NDJSON_EXTENSIONS
+YAML_EXTENSIONS = ('.yaml', '.yml')
+
+LOAD_MODES = {
+    'sample': "Sample (first rows only)",
+    'scan': "Scan (stream every row, keep a sample)",
+    'full': "Full (load everything into memory)",
+}
+DEFAULT_LOAD_MODE = 'sample'
+
+# ----------------------- Column Statistics -----------------------
+def _common_dtype(left, right):
+    if left == right:
+        return left
+    if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+        try:
+            return np.result_type(left, right)
+        except TypeError:
+            return np.dtype('float64')
+    return np.dtype('object')
+
+class ColumnStats:
+    """Running statistics for one column, updated chunk by chunk.
+
+    With sketch=True every value is also hashed into a HyperLogLog sketch, so
+    distinct can be estimated; that is a full hashing pass over the column,
+    so it is only done when asked for.
+    """
+
+    def __init__(self, name, sketch=False):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.dtype = None
+        self.minimum = None
+        self.maximum = None
+        self.sketch = HyperLogLog() if sketch else None
+
+    def add_missing(self, n):
+        """Counts n rows in which the column did not appear, e.g. records without the key."""
+        self.rows += n
+        self.nulls += n
+
+    def update(self, series):
+        self.rows += len(series)
+        self.nulls += int(series.isna().sum())
+        self.dtype = series.dtype if self.dtype is None else _common_dtype(self.dtype, series.dtype)
+        if self.sketch is not None:
+            self.sketch.update(series)
+        ordered = pd.api.types.is_numeric_dtype(self.dtype) or pd.api.types.is_datetime64_any_dtype(self.dtype)
+        if not ordered or pd.api.types.is_bool_dtype(self.dtype):
+            self.minimum = self.maximum = None
+            return
+        values = series.dropna()
+        if values.empty:
+            return
+        low, high = values.min(), values.max()
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    @property
+    def distinct(self):
+        """HyperLogLog estimate of the distinct non-null values seen so far, or None without a sketch."""
+        if self.sketch is None:
+            return None
+        return min(self.sketch.estimate(), self.rows - self.nulls)
+
+    @property
+    def null_rate(self):
+        return self.nulls / self.rows if self.rows else 0.0
+
+    def as_dict(self):
+        stats = {
+            'column': self.name,
+            'dtype': str(self.dtype),
+            'rows': self.rows,
+            'nulls': self.nulls,
+            'null_rate': round(self.null_rate, 4),
+        }
+        if self.sketch is not None:
+            stats['distinct_approx'] = round(self.distinct)
+        stats['min'] = None if self.minimum is None else str(self.minimum)
+        stats['max'] = None if self.maximum is None else str(self.maximum)
+        return stats
+
+def update_stats(stats, chunk, sketch=False):
+    """Folds one chunk into stats, a dict of column name to ColumnStats.
+
+    Columns first seen in this chunk, and known columns missing from it,
+    are counted as null for the rows they were absent from. sketch is
+    passed to the ColumnStats of new columns.
+    """
+    rows_before = max((column_stats.rows for column_stats in stats.values()), default=0)
+    for column in chunk.columns:
+        if column not in stats:
+            stats[column] = ColumnStats(column, sketch)
+            stats[column].add_missing(rows_before)
+        stats[column].update(chunk[column])
+    for column, column_stats in stats.items():
+        if column not in chunk.columns:
+            column_stats.add_missing(len(chunk))
+    return stats
+
+# ----------------------- Flat File -----------------------
+class FlatFile:
+    """A loaded flat file: a bounded sample, per-column stats and the full frame on demand.
+
+    complete is True when the sample holds every row of the file.
+    """
+
+    def __init__(self, name, sample, stats, rows_profiled, complete, materialize=None):
+        self.name = name
+        self.sample = sample
+        self.stats = stats
+        self.rows_profiled = rows_profiled
+        self.complete = complete
+        self._materialize = materialize
+        self._frame = sample if complete else None
+
+    @classmethod
+    def from_frame(cls, name, df):
+        return cls(name, df, update_stats({}, df), len(df), complete=True)
+
+    @property
+    def columns(self):
+        return list(self.sample.columns)
+
+    def frame(self):
+        """Returns every row of the file, reading it on first use."""
+        if self._frame is None:
+            self._frame = self._materialize()
+        return self._frame
+
+    def stats_frame(self):
+        return pd.DataFrame([column_stats.as_dict() for column_stats in self.stats.values()])
+
+def file_digest(source):
+    """SHA-256 of a seekable file object, read in CSV_BLOCK_BYTES chunks; leaves it rewound."""
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(CSV_BLOCK_BYTES), b''):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+# ----------------------- Chunked Reading -----------------------
+def read_chunks(name, chunks, mode, sample_rows, materialize, sketch=False):
+    """Builds a FlatFile from an iterator of DataFrame chunks in 'sample' or 'scan' mode.
+
+    sketch adds distinct-count sketches to the stats of a scan; a sample is
+    small enough for the profiler to count itself.
+    """
+    sketch = sketch and mode == 'scan'
+    sampled, stats, rows = [], {}, 0
+    complete = True
+    for chunk in chunks:
+        if rows < sample_rows:
+            sampled.append(chunk.iloc[:sample_rows - rows])
+        update_stats(stats, chunk if mode == 'scan' else chunk.iloc[:sample_rows - rows], sketch)
+        rows += len(chunk)
+        if mode != 'scan' and rows >= sample_rows:
+            complete = False
+            break
+    sample = pd.concat(sampled, ignore_index=True) if sampled else pd.DataFrame()
+    rows_profiled = rows if mode == 'scan' else len(sample)
+    complete = complete and rows <= sample_rows
+    return FlatFile(name, sample, stats, rows_profiled, complete, materialize=materialize)
+
+def iter_record_chunks(records, max_depth=None, batch_rows=RECORD_BATCH_ROWS):
+    """Flattens an iterator of dict records into DataFrame chunks of batch_rows rows.
+
+    Nested objects become dotted columns down to max_depth levels (None for all).
+    """
+    while True:
+        batch = list(islice(records, batch_rows))
+        if not batch:
+            return
+        yield pd.json_normalize(batch, max_level=max_depth)
+
+def concat_chunks(chunks):
+    chunks = list(chunks)
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+# ----------------------- CSV -----------------------
+def _arrow_to_pandas(table_or_batch):
+    return table_or_batch.to_pandas(date_as_object=False)
+
+def _csv_read_options():
+    return pv.ReadOptions(block_size=CSV_BLOCK_BYTES)
+
+def _iter_csv_chunks(source):
+    """Yields the CSV as DataFrame chunks from pyarrow's streaming reader.
+
+    pyarrow infers column types from the first block; if a later block does
+    not fit them, the remaining rows are re-read with pandas in row chunks.
+    """
+    source.seek(0)
+    rows_read = 0
+    try:
+        reader = pv.open_csv(source, read_options=_csv_read_options())
+        for batch in reader:
+            chunk = _arrow_to_pandas(batch)
+            rows_read += len(chunk)
+            yield chunk
+        return
+    except pa.ArrowInvalid:
+        pass
+    source.seek(0)
+    skip = range(1, rows_read + 1) if rows_read else None
+    yield from pd.read_csv(source, skiprows=skip, chunksize=CSV_FALLBACK_CHUNK_ROWS)
+
+def read_full_csv(source):
+    """Reads the whole CSV with pyarrow's multi-threaded reader, falling back to pandas."""
+    source.seek(0)
+    try:
+        return _arrow_to_pandas(pv.read_csv(source, read_options=_csv_read_options()))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pd.read_csv(source)
+
+def read_csv(source, name=None, mode=DEFAULT_LOAD_MODE, sample_rows=SAMPLE_ROWS, sketch=False):
+    """Reads a seekable CSV file object into a FlatFile.
+
+    mode is 'sample' (stop after sample_rows rows), 'scan' (stream every row
+    into the column stats, keep the first sample_rows) or 'full' (load it all).
+    sketch=True also estimates each column's distinct values during a scan.
+    """
+    name = name or getattr(source, 'name', 'upload.csv')
+    if mode == 'full':
+        return FlatFile.from_frame(name, read_full_csv(source))
+    return read_chunks(name, _iter_csv_chunks(source), mode, sample_rows, materialize=lambda: read_full_csv(source),
+                       sketch=sketch)
+
+# ----------------------- JSON -----------------------
+def _starts_with_array(source):
+    source.seek(0)
+    head = source.read(4096).lstrip(b'\xef\xbb\xbf \t\r\n')
+    source.seek(0)
+    return head.startswith(b'[')
+
+def iter_json_records(source, record_path=None):
+    """Yields the records of a JSON document, or of every line of an NDJSON file, without loading it whole.
+
+    record_path is a dotted path to the array of records, e.g. 'data.results'.
+    Without it, a top-level array yields its elements and a top-level object
+    (or each NDJSON line) is a record of its own.
+    """
+    if record_path:
+        prefix = f"{record_path}.item"
+    else:
+        prefix = 'item' if _starts_with_array(source) else ''
+    source.seek(0)
+    for record in ijson.items(source, prefix, multiple_values=True, use_float=True):
+        if not isinstance(record, dict):
+            raise ValueError("Unsupported JSON format: records must be objects.")
+        yield record
+
+def iter_json_chunks(source, record_path=None, max_depth=None):
+    return iter_record_chunks(iter_json_records(source, record_path), max_depth)
+
+def read_full_json(source, record_path=None, max_depth=None):
+    return concat_chunks(iter_json_chunks(source, record_path, max_depth))
+
+def read_json(source, name=None, mode=DEFAULT_LOAD_MODE, record_path=None, max_depth=None, sample_rows=SAMPLE_ROWS,
+              sketch=False):
+    """Reads a seekable JSON or NDJSON file object into a FlatFile, in the modes read_csv takes."""
+    name = name or getattr(source, 'name', 'upload.json')
+    if mode == 'full':
+        return FlatFile.from_frame(name, read_full_json(source, record_path, max_depth))
+    chunks = iter_json_chunks(source, record_path, max_depth)
+    return read_chunks(name, chunks, mode, sample_rows,
+                       materialize=lambda: read_full_json(source, record_path, max_depth), sketch=sketch)
+
+# ----------------------- YAML -----------------------
+def iter_yaml_records(source, record_path=None):
+    """Yields the records of every document in a YAML stream, one document at a time.
+
+    A document that is a list yields its elements, a mapping is one record,
+    and record_path selects a list nested in each document, e.g. 'spec.items'.
+    """
+    source.seek(0)
+    for document in yaml.load_all(source, Loader=YAMLLoader):
+        if document is None:
+            continue
+        if record_path:
+            for key in record_path.split('.'):
+                document = document.get(key) if isinstance(document, dict) else None
+            if document is None:
+                continue
+        records = document if isinstance(document, list) else [document]
+        for record in records:
+            if not isinstance(record, dict):
+                raise ValueError("Unsupported YAML format: records must be mappings.")
+            yield record
+
+def iter_yaml_chunks(source, record_path=None, max_depth=None):
+    return iter_record_chunks(iter_yaml_records(source, record_path), max_depth)
+
+def read_full_yaml(source, record_path=None, max_depth=None):
+    return concat_chunks(iter_yaml_chunks(source, record_path, max_depth))
+
+def read_yaml(source, name=None, mode=DEFAULT_LOAD_MODE, record_path=None, max_depth=None, sample_rows=SAMPLE_ROWS,
+              sketch=False):
+    """Reads a seekable, possibly multi-document YAML file object into a FlatFile, in the modes read_csv takes."""
+    name = name or getattr(source, 'name', 'upload.yaml')
+    if mode == 'full':
+        return FlatFile.from_frame(name, read_full_yaml(source, record_path, max_depth))
+    chunks = iter_yaml_chunks(source, record_path, max_depth)
+    return read_chunks(name, chunks, mode, sample_rows,
+                       materialize=lambda: read_full_yaml(source, record_path, max_depth), sketch=sketch)
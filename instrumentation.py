@@ -0,0 +1,157 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Timing spans and counters for the expense and WBR apps. A Recorder is
+# activated for the current script run (or batch); instrumented code calls
+# the module-level span()/count()/observe(), which do nothing when no
+# recorder is active. Finished events are appended to a JSON-lines log.
+#
+#   recorder = Recorder('expense-app')
+#   activate(recorder)
+#   with span('s3.download', key=key):
+#       ...
+#   count('s3.bytes_downloaded', len(body))
+#   recorder.flush()
+
+# ----------------------- Configuration -----------------------
+INSTRUMENTATION_LOG = os.getenv('INSTRUMENTATION_LOG', 'pipeline_metrics.jsonl')
+# Recent durations kept per span name for the p95; calls, total and max cover every call.
+SPAN_WINDOW = int(os.getenv('INSTRUMENTATION_SPAN_WINDOW', '1000'))
+
+_current = contextvars.ContextVar('instrumentation_recorder', default=None)
+
+# ----------------------- Recorder -----------------------
+class Recorder:
+    """Collects span durations and counters for one run, safe to share across threads.
+
+    Memory stays fixed however long the run (or Streamlit session) lives:
+    each span name keeps a call count, total and max, plus its last
+    span_window durations for the p95.
+    """
+
+    def __init__(self, run_name, log_path=INSTRUMENTATION_LOG, span_window=SPAN_WINDOW):
+        self.run_name = run_name
+        self.log_path = log_path
+        self.spans = defaultdict(lambda: deque(maxlen=span_window))
+        self.span_totals = defaultdict(lambda: {'calls': 0, 'total': 0.0, 'max': 0.0})
+        self.counters = defaultdict(int)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **fields):
+        """Records a span measured elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.spans[name].append(seconds)
+            totals = self.span_totals[name]
+            totals['calls'] += 1
+            totals['total'] += seconds
+            totals['max'] = max(totals['max'], seconds)
+            self._pending.append({'type': 'span', 'name': name, 'seconds': round(seconds, 6), **fields})
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def span(self, name, **fields):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **fields)
+
+    def span_summary(self):
+        """Returns one row per span name: calls, total, mean, p95 (over the recent window) and max seconds."""
+        with self._lock:
+            spans = {name: (dict(self.span_totals[name]), list(seconds)) for name, seconds in self.spans.items()}
+        rows = []
+        for name, (totals, recent) in spans.items():
+            rows.append({
+                'span': name,
+                'calls': totals['calls'],
+                'total_s': round(totals['total'], 4),
+                'mean_ms': round(totals['total'] / totals['calls'] * 1000, 3),
+                'p95_ms': round(pd.Series(recent).quantile(0.95) * 1000, 3),
+                'max_ms': round(totals['max'] * 1000, 3),
+            })
+        columns = ['span', 'calls', 'total_s', 'mean_ms', 'p95_ms', 'max_ms']
+        return pd.DataFrame(rows, columns=columns).sort_values('total_s', ascending=False, ignore_index=True)
+
+    def flush(self):
+        """Appends the events recorded since the last flush, plus a counter snapshot, to the log."""
+        with self._lock:
+            events, self._pending = self._pending, []
+            counters = dict(self.counters)
+        if not events or not self.log_path:
+            return
+        logged_at = datetime.now(timezone.utc).isoformat()
+        with open(self.log_path, 'a', encoding='utf-8') as log:
+            for event in events:
+                log.write(json.dumps({'run': self.run_name, 'at': logged_at, **event}, default=str) + "\n")
+            log.write(json.dumps({'run': self.run_name, 'at': logged_at, 'type': 'counters', 'counters': counters}) + "\n")
+
+# ----------------------- Active Recorder -----------------------
+def activate(recorder):
+    """Makes recorder the target of span()/count()/observe() in the current context."""
+    _current.set(recorder)
+    return recorder
+
+def current():
+    return _current.get()
+
+@contextmanager
+def span(name, **fields):
+    recorder = _current.get()
+    if recorder is None:
+        yield
+    else:
+        with recorder.span(name, **fields):
+            yield
+
+def observe(name, seconds, **fields):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.observe(name, seconds, **fields)
+
+def count(name, n=1):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.count(name, n)
+
+def traced(name):
+    """Decorator that records every call of the function as a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def bind(func):
+    """Wraps func to run in a copy of the caller's context, so spans recorded
+    in thread pool workers reach the caller's recorder."""
+    return functools.partial(contextvars.copy_context().run, func)
+
+# ----------------------- Streamlit Panel -----------------------
+def render_sidebar(recorder, title="⏱ Instrumentation"):
+    """Shows the recorder's spans and counters in a collapsed sidebar expander."""
+    import streamlit as st
+
+    with st.sidebar.expander(title, expanded=False):
+        if not recorder.spans and not recorder.counters:
+            st.caption("Nothing recorded yet.")
+            return
+        st.dataframe(recorder.span_summary(), hide_index=True, use_container_width=True)
+        for name, value in sorted(recorder.counters.items()):
+            st.write(f"**{name}**: {value:,}")
+        st.caption(f"Events are appended to {recorder.log_path}")
@@ -1,34 +1,22 @@
 import streamlit as st
-import pandas as pd
 import yaml
-import json
+
+from column_profiler import build_profile
+from flat_file_loader import (DEFAULT_LOAD_MODE, JSON_EXTENSIONS, LOAD_MODES, YAML_EXTENSIONS, file_digest, read_csv,
+                              read_json, read_yaml)
 
 # ----------------------- Load Flat File -----------------------
-def load_flat_file(uploaded_file):
+def load_flat_file(uploaded_file, mode=DEFAULT_LOAD_MODE, record_path=None, max_depth=None):
     try:
         if uploaded_file.name.endswith('.csv'):
-            return pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith('.json'):
-            raw_json = json.load(uploaded_file)
-            # If JSON is a list of dictionaries, treat as a flat file
-            if isinstance(raw_json, list):
-                return pd.json_normalize(raw_json)
-            elif isinstance(raw_json, dict):
-                # Flatten the dictionary if needed
-                return pd.json_normalize(raw_json)
-            else:
-                st.error("⚠️ Unsupported JSON format.")
-                return None
-        elif uploaded_file.name.endswith(('.yaml', '.yml')):
-            raw_yaml = yaml.safe_load(uploaded_file)
-            # Handle YAML similarly to JSON
-            if isinstance(raw_yaml, list):
-                return pd.json_normalize(raw_yaml)
-            elif isinstance(raw_yaml, dict):
-                return pd.json_normalize(raw_yaml)
-            else:
-                st.error("⚠️ Unsupported YAML format.")
-                return None
+            # Large CSVs are sampled or streamed; see flat_file_loader.LOAD_MODES
+            return read_csv(uploaded_file, uploaded_file.name, mode=mode)
+        elif uploaded_file.name.endswith(JSON_EXTENSIONS):
+            # JSON and NDJSON are parsed incrementally and flattened in batches of records
+            return read_json(uploaded_file, uploaded_file.name, mode=mode, record_path=record_path, max_depth=max_depth)
+        elif uploaded_file.name.endswith(YAML_EXTENSIONS):
+            # Every document of a multi-document stream is read, with the libyaml loader when available
+            return read_yaml(uploaded_file, uploaded_file.name, mode=mode, record_path=record_path, max_depth=max_depth)
         else:
             st.error("❌ Unsupported file format. Please upload CSV, JSON, or YAML.")
             return None
@@ -36,6 +24,28 @@ def load_flat_file(uploaded_file):
         st.error(f"⚠️ Error loading file: {e}")
         return None
 
+def cached_flat_file(uploaded_file, mode, record_path=None, max_depth=None):
+    # Streamlit reruns the script on every widget change; keep the loaded file until the upload or options change
+    key = (uploaded_file.file_id, mode, record_path, max_depth)
+    if st.session_state.get("flat_file_key") != key:
+        flat_file = load_flat_file(uploaded_file, mode, record_path, max_depth)
+        if flat_file is None:
+            return None
+        st.session_state["flat_file"] = flat_file
+        st.session_state["flat_file_key"] = key
+    return st.session_state["flat_file"]
+
+def uploaded_file_hash(uploaded_file):
+    # Hash each upload once; the profile cache below is keyed by content, so re-uploads of the same file reuse it
+    hashes = st.session_state.setdefault("file_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = file_digest(uploaded_file)
+    return hashes[uploaded_file.file_id]
+
+@st.cache_data(show_spinner="Profiling columns...", max_entries=16)
+def cached_profile(file_key, _data, _stats=None):
+    return build_profile(_data, _stats)
+
 # ----------------------- Generate LookML from DataFrame -----------------------
 def generate_lookml_from_df(df, view_name, column_config):
     lookml_template = f"view: {view_name} {{\n  sql_table_name: ANALYTICS_DEV.GSUNDARESAN_CORE.{view_name} ;;\n\n"
@@ -61,14 +71,26 @@ def main():
     st.title("📊 Advanced LookML Generator")
     st.write("Upload CSV, JSON, or YAML and customize LookML views with field types and data type overrides.")
 
-    uploaded_file = st.file_uploader("📁 Upload CSV, JSON, or YAML File", type=["csv", "json", "yaml", "yml"])
+    uploaded_file = st.file_uploader("📁 Upload CSV, JSON, or YAML File", type=["csv", "json", "ndjson", "jsonl", "yaml", "yml"])
 
     if uploaded_file:
-        data = load_flat_file(uploaded_file)
-        if data is not None:
+        load_mode = st.sidebar.selectbox("File Loading", list(LOAD_MODES), format_func=LOAD_MODES.get)
+        record_path, max_depth = None, None
+        if uploaded_file.name.endswith(JSON_EXTENSIONS + YAML_EXTENSIONS):
+            record_path = st.sidebar.text_input("Record Path", help="Dotted path to the list of records, e.g. data.results") or None
+            max_depth = int(st.sidebar.number_input("Nesting Depth (-1 = all)", min_value=-1, value=-1, step=1))
+            max_depth = None if max_depth < 0 else max_depth
+        flat_file = cached_flat_file(uploaded_file, load_mode, record_path, max_depth)
+        if flat_file is not None:
+            data = flat_file.sample
+            profile = cached_profile((uploaded_file_hash(uploaded_file), load_mode, record_path, max_depth), data, flat_file.stats)
             st.success("✅ Flat file loaded successfully!")
             st.write("### 🗂️ Data Preview")
             st.dataframe(data.head())
+            if not flat_file.complete:
+                st.caption(f"Showing the first {len(data):,} rows; column statistics cover {flat_file.rows_profiled:,} rows.")
+            with st.expander("📈 Column Statistics"):
+                st.dataframe(flat_file.stats_frame(), hide_index=True)
 
             # Input for View Name
             view_name = st.text_input("📋 Enter LookML View Name", value="MY_VIEW")
@@ -77,8 +99,8 @@ def main():
             column_config = {}
             st.write("### 🔧 Configure Columns:")
 
-            for col in data.columns:
-                col_dtype = data[col].dtype
+            for col in profile.names:
+                col_dtype = profile[col].dtype
                 default_field_type = "measure" if col_dtype in ['int64', 'float64'] else "dimension"
                 default_data_type = "sum" if default_field_type == "measure" else "string"
 
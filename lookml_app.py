@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
-import json
 import yaml
 from typing import Optional, Dict, Any, List
 import matplotlib.pyplot as plt  # Import matplotlib
 
+from column_profiler import (CARDINALITY_METHODS, UNIQUE_RATIO_THRESHOLD, DatasetProfile, build_profile,
+                             infer_lookml_type)
+from flat_file_loader import (DEFAULT_LOAD_MODE, JSON_EXTENSIONS, LOAD_MODES, YAML_EXTENSIONS, FlatFile, file_digest,
+                              read_csv, read_json, read_yaml)
+
 # ----------------------- Constants -----------------------
-SUPPORTED_FILE_TYPES = ["csv", "json", "yaml", "yml"]
+SUPPORTED_FILE_TYPES = ["csv", "json", "ndjson", "jsonl", "yaml", "yml"]
 DEFAULT_MODEL_NAME = "your_model_name"
 DEFAULT_VIEW_NAME = "your_view_name"
 DEFAULT_DASHBOARD_TITLE = "My Advanced LookML Dashboard"
@@ -19,31 +23,26 @@ def to_lookml_name(name: str) -> str:
 
 def infer_data_type(column: pd.Series) -> str:
     """Infers the data type of a Pandas Series."""
-    if pd.api.types.is_datetime64_any_dtype(column):
-        return "date"
-    elif pd.api.types.is_numeric_dtype(column):
-        return "number"
-    else:
-        return "string"
+    return infer_lookml_type(column.dtype)
 
 # ----------------------- Automated Classification -----------------------
-def auto_classify_columns(df: pd.DataFrame) -> Dict[str, Dict[str, str]]:
-    """Automatically classifies columns as dimensions or measures."""
+def auto_classify_columns(profile: DatasetProfile) -> Dict[str, Dict[str, str]]:
+    """Automatically classifies columns as dimensions or measures from the cached column profile."""
     column_config = {}
 
-    for col in df.columns:
-        unique_ratio = df[col].nunique() / len(df)
-        data_type = infer_data_type(df[col])
+    for col, column_profile in profile.columns.items():
+        unique_ratio = column_profile.unique_ratio
+        data_type = column_profile.data_type
 
         # Classify based on uniqueness and data type
         if data_type == "number":
-            field_type = "measure" if unique_ratio < 0.1 else "dimension"
+            field_type = "measure" if unique_ratio < UNIQUE_RATIO_THRESHOLD else "dimension"
         elif data_type == "date":
             field_type = "dimension"
         elif data_type == "yesno":
             field_type = "dimension"
         else:
-            field_type = "dimension" if unique_ratio > 0.1 else "measure"
+            field_type = "dimension" if unique_ratio > UNIQUE_RATIO_THRESHOLD else "measure"
 
         column_config[col] = {
             "field_type": field_type,
@@ -53,9 +52,8 @@ def auto_classify_columns(df: pd.DataFrame) -> Dict[str, Dict[str, str]]:
     return column_config
 
 # ----------------------- Dashboard Suggestion -----------------------
-def suggest_dashboard_layout(df: pd.DataFrame) -> List[Dict[str, Any]]:
-    """Suggests dashboard tiles based on dataset structure."""
-    column_config = auto_classify_columns(df)
+def suggest_dashboard_layout(column_config: Dict[str, Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Suggests dashboard tiles from the auto-classified column configuration."""
     time_fields = [col for col, cfg in column_config.items() if cfg["data_type"] == "date"]
     numeric_measures = [col for col, cfg in column_config.items() if cfg["field_type"] == "measure"]
     categorical_dimensions = [col for col, cfg in column_config.items() if cfg["field_type"] == "dimension"]
@@ -117,29 +115,18 @@ def generate_dashboard_mockup(tile_suggestions: List[Dict[str, Any]]):
     st.pyplot(fig)  # Use st.pyplot to display the Matplotlib figure in Streamlit
 
 # ----------------------- File Loading -----------------------
-def load_flat_file(uploaded_file) -> Optional[pd.DataFrame]:
-    """Loads a flat file (CSV, JSON, YAML) into a Pandas DataFrame."""
+def load_flat_file(uploaded_file, mode: str = DEFAULT_LOAD_MODE, record_path: Optional[str] = None,
+                   max_depth: Optional[int] = None) -> Optional[FlatFile]:
+    """Loads a flat file (CSV, JSON/NDJSON, YAML) as a FlatFile, sampled or streamed according to mode."""
     try:
         if uploaded_file.name.endswith(".csv"):
-            return pd.read_csv(uploaded_file)
-        elif uploaded_file.name.endswith(".json"):
-            raw_json = json.load(uploaded_file)
-            if isinstance(raw_json, list):
-                return pd.json_normalize(raw_json)
-            elif isinstance(raw_json, dict):
-                return pd.json_normalize(raw_json)
-            else:
-                st.error("⚠️ Unsupported JSON format: Must be a list or dictionary.")
-                return None
-        elif uploaded_file.name.endswith((".yaml", ".yml")):
-            raw_yaml = yaml.safe_load(uploaded_file)
-            if isinstance(raw_yaml, list):
-                return pd.json_normalize(raw_yaml)
-            elif isinstance(raw_yaml, dict):
-                return pd.json_normalize(raw_yaml)
-            else:
-                st.error("⚠️ Unsupported YAML format: Must be a list or dictionary.")
-                return None
+            return read_csv(uploaded_file, uploaded_file.name, mode=mode, sketch=True)
+        elif uploaded_file.name.endswith(JSON_EXTENSIONS):
+            return read_json(uploaded_file, uploaded_file.name, mode=mode, record_path=record_path, max_depth=max_depth,
+                             sketch=True)
+        elif uploaded_file.name.endswith(YAML_EXTENSIONS):
+            return read_yaml(uploaded_file, uploaded_file.name, mode=mode, record_path=record_path, max_depth=max_depth,
+                             sketch=True)
         else:
             st.error(f"❌ Unsupported file format. Please upload one of: {', '.join(SUPPORTED_FILE_TYPES)}")
             return None
@@ -147,6 +134,53 @@ def load_flat_file(uploaded_file) -> Optional[pd.DataFrame]:
         st.error(f"⚠️ Error loading file: {e}")
         return None
 
+def cached_flat_file(uploaded_file, mode: str, record_path: Optional[str] = None,
+                     max_depth: Optional[int] = None) -> Optional[FlatFile]:
+    """Returns the loaded file from session state, reading it again only when the upload or options change."""
+    key = (uploaded_file.file_id, mode, record_path, max_depth)
+    if st.session_state.get("flat_file_key") != key:
+        flat_file = load_flat_file(uploaded_file, mode, record_path, max_depth)
+        if flat_file is None:
+            return None
+        st.session_state["flat_file"] = flat_file
+        st.session_state["flat_file_key"] = key
+    return st.session_state["flat_file"]
+
+def record_load_options(uploaded_file) -> Dict[str, Any]:
+    """Sidebar inputs for JSON/YAML record selection and flattening depth; empty for CSV."""
+    if not uploaded_file.name.endswith(JSON_EXTENSIONS + YAML_EXTENSIONS):
+        return {}
+    record_path = st.sidebar.text_input("Record Path", help="Dotted path to the list of records, e.g. data.results")
+    max_depth = st.sidebar.number_input("Nesting Depth", min_value=-1, value=-1, step=1,
+                                        help="Levels of nested objects to flatten into columns; -1 flattens all, "
+                                             "0 keeps nested objects as values")
+    return {"record_path": record_path or None, "max_depth": None if max_depth < 0 else int(max_depth)}
+
+def uploaded_file_hash(uploaded_file) -> str:
+    """Content hash of the upload, computed once per upload and kept in session state."""
+    hashes = st.session_state.setdefault("file_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = file_digest(uploaded_file)
+    return hashes[uploaded_file.file_id]
+
+@st.cache_data(show_spinner="Profiling columns...", max_entries=16)
+def cached_profile(file_key: tuple, cardinality_method: str, _flat_file: FlatFile) -> DatasetProfile:
+    """Column profile for one file and set of load options; reruns and re-uploads of the same file reuse it.
+
+    exact counts every row, so a file loaded as a sample or scan is read in full for it.
+    """
+    if cardinality_method == "exact":
+        return build_profile(_flat_file.frame(), method="exact")
+    return build_profile(_flat_file.sample, _flat_file.stats, method=cardinality_method)
+
+def render_file_profile(flat_file: FlatFile):
+    """Shows how much of the file was read and the running column statistics."""
+    if not flat_file.complete:
+        st.caption(f"Previewing and configuring from the first {len(flat_file.sample):,} rows; "
+                   f"column statistics cover {flat_file.rows_profiled:,} rows.")
+    with st.expander("📈 Column Statistics"):
+        st.dataframe(flat_file.stats_frame(), hide_index=True)
+
 # ----------------------- LookML Generation -----------------------
 def generate_lookml_view(df: pd.DataFrame, view_name: str, column_config: Dict[str, Dict[str, str]],
                          sql_table_name: str) -> str:
@@ -236,11 +270,22 @@ def main():
     )
 
     if uploaded_file is not None:
-        data = load_flat_file(uploaded_file)
-
-        if data is not None:
+        load_mode = st.sidebar.selectbox("File Loading", list(LOAD_MODES), format_func=LOAD_MODES.get)
+        record_options = record_load_options(uploaded_file)
+        cardinality_method = st.sidebar.selectbox(
+            "Cardinality Profiling", CARDINALITY_METHODS,
+            help="auto samples rows and falls back to a full pass near the threshold; "
+                 "exact uses nunique() over every row of the file",
+        )
+        flat_file = cached_flat_file(uploaded_file, load_mode, **record_options)
+
+        if flat_file is not None:
+            data = flat_file.sample
+            file_key = (uploaded_file_hash(uploaded_file), load_mode, *record_options.values())
+            profile = cached_profile(file_key, cardinality_method, flat_file)
             st.write("### 🗂️ Data Preview")
             st.dataframe(data.head())
+            render_file_profile(flat_file)
 
             # View Configuration
             st.write("### ⚙️ View Configuration")
@@ -248,19 +293,19 @@ def main():
             sql_table_name = st.text_input("SQL Table Name", value=f"ANALYTICS_DEV.GSUNDARESAN_CORE.{view_name}")
 
             # --- Automated Column Configuration ---
+            auto_config = auto_classify_columns(profile)
             if st.checkbox("✨ Auto-Configure Columns"):
-                column_config = auto_classify_columns(data)
+                column_config = auto_config
                 st.write("#### Auto-Generated Column Configuration:")
                 st.write(column_config)
             else:
                 column_config = {}
                 st.write("### 🔧 Configure Columns:")
 
-                for col in data.columns:
+                for col in profile.names:
                     st.markdown(f"**Column:** `{col}`")
-                    col_dtype = data[col].dtype
                     default_field_type = "dimension"
-                    default_data_type = infer_data_type(data[col])
+                    default_data_type = profile[col].data_type
 
                     field_type = st.selectbox(
                         f"Field type for `{col}`",
@@ -306,7 +351,7 @@ def main():
 
             # --- Automated Dashboard Suggestions ---
             if st.checkbox("💡 Suggest Dashboard Layout"):
-                tile_suggestions = suggest_dashboard_layout(data)
+                tile_suggestions = suggest_dashboard_layout(auto_config)
                 st.write("#### Suggested Dashboard Layout:")
                 st.write(tile_suggestions)
                 st.write("#### Dashboard Mockup:")
@@ -318,6 +363,13 @@ def main():
                 tile_configs = []
                 num_tiles = st.number_input("🧱 Number of Tiles", min_value=1, max_value=10, value=2, step=1)
 
+                # Field options are the same for every tile, so they are built once from the profile
+                date_fields = profile.date_fields
+                all_dimensions = profile.names + [f"{col}_year" for col in date_fields] + [
+                                    f"{col}_month" for col in date_fields]
+                pivot_options = [None] + profile.names + [f"{p}_year" for p in date_fields] + [
+                                    f"{p}_week" for p in date_fields]
+
                 for i in range(num_tiles):
                     st.subheader(f"Tile {i+1} Configuration")
                     tile_title = st.text_input(f"Tile {i+1} Title", value=f"Tile {i+1}", key=f"tile_title_{i}")
@@ -326,18 +378,9 @@ def main():
                                             ["looker_line", "looker_bar", "single_value", "looker_grid"],
                                             key=f"tile_type_{i}")
 
-                    # Fetching time-based and non-time-based fields
-                    date_fields = [col for col in data.columns if
-                                'date' in col.lower() or pd.api.types.is_datetime64_any_dtype(data[col])]
-                    all_dimensions = list(data.columns) + [f"{col}_year" for col in date_fields] + [
-                                        f"{col}_month" for col in date_fields]
-
                     selected_fields = st.multiselect(f"Select Fields for Tile {i+1}", all_dimensions, key=f"fields_{i}")
 
                     # Pivots
-                    pivot_options = [None] + list(data.columns) + [f"{p}_year" for p in date_fields] + [
-                                        f"{p}_week" for p in date_fields]
-
                     pivots = st.selectbox(
                         f"Pivots for Tile {i+1}",
                         pivot_options,
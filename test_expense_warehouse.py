@@ -0,0 +1,36 @@
+import fitz  # PyMuPDF
+import pandas as pd
+import pytest
+
+from expense_pipeline import extract_all
+from expense_warehouse import DuckDBLoader, add_receipt_hash
+
+pytest.importorskip('duckdb')
+
+def make_receipt(lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    for number, line in enumerate(["Passenger Name: Jane Doe"] + lines + ["Total 999.00"]):
+        page.insert_text((50, 60 + 15 * number), line)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+def extract(name, pdf_bytes):
+    [result] = extract_all([(name, pdf_bytes)], max_workers=1)
+    return result.df
+
+def test_identical_line_on_two_receipts_loads_twice(tmp_path):
+    # No date on the shared line, so the two rows match in every content column.
+    first = extract('first.pdf', make_receipt(["Taxi to hotel 25.00", "2024-01-02 Lunch at cafe 12.00"]))
+    second = extract('second.pdf', make_receipt(["Taxi to hotel 25.00", "2024-02-03 Dinner with client 40.00"]))
+    loader = DuckDBLoader(str(tmp_path / 'warehouse.duckdb'))
+
+    assert loader.load(add_receipt_hash(first), 'EXPENSES') == 2
+    assert loader.load(add_receipt_hash(second), 'EXPENSES') == 2
+    assert loader.load(add_receipt_hash(pd.concat([first, second], ignore_index=True)), 'EXPENSES') == 0
+
+def test_equal_lines_within_one_receipt_stay_two_rows():
+    df = extract('receipt.pdf', make_receipt(["Taxi to hotel 25.00", "Taxi to hotel 25.00"]))
+    hashes = add_receipt_hash(df)['RECEIPT_HASH']
+    assert len(df) == 2 and hashes.nunique() == 2
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import instrumentation
+from expense_sources import S3_MAX_WORKERS, fetch_pdfs_from_s3, iter_local_pdfs, parse_s3_url
+from wbr_metrics import (DEFAULT_MAX_WORKERS, DEFAULT_STORE_PATH, METRICS, WBRMetricsStore, build_week_matrix,
+                         compare_frames, extract_all_metrics, weekly_trends)
+
+# Headless WBR ingestion for the weekly job: walks a local directory or an
+# s3://bucket/prefix (paginated), extracts every report across a process
+# pool and writes the week x metric table, the latest week-over-week
+# comparison and the full trend table. Prints a JSON run summary.
+# To run against a local S3 stand-in, start `moto_server` and set
+# AWS_ENDPOINT_URL=http://localhost:5000.
+#
+#   python wbr_batch.py ./wbr_reports --output weeks.csv --comparison latest.csv
+#   python wbr_batch.py s3://reports-bucket/wbr/ --output weeks.parquet --trends trends.parquet --store wbr_metrics.sqlite
+
+def collect_reports(source, spool_dir, s3_workers=S3_MAX_WORKERS):
+    """Yields (name, path) for every PDF under a directory or an s3:// prefix.
+
+    S3 objects are written to spool_dir as they download, so the extraction
+    workers open every report by path.
+    """
+    if not source.startswith('s3://'):
+        yield from iter_local_pdfs(source)
+        return
+    bucket, prefix = parse_s3_url(source)
+    for number, (key, pdf_bytes, _) in enumerate(fetch_pdfs_from_s3(prefix=prefix, bucket=bucket,
+                                                                      max_workers=s3_workers)):
+        path = os.path.join(spool_dir, f"{number:05d}.pdf")
+        with open(path, 'wb') as spooled:
+            spooled.write(pdf_bytes)
+        yield key, path
+
+def write_table(df, path):
+    """Writes df as Parquet, xlsx or CSV, chosen by the file extension."""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith('.xlsx'):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def latest_comparison(matrix):
+    """Compares the most recent week in the matrix with the week before it, metric by metric.
+
+    The prior week is looked up by date (7 days back), as in weekly_trends, so
+    when that week is missing every change is NaN rather than measured
+    against an older week.
+    """
+    if len(matrix) < 2:
+        return pd.DataFrame()
+    values = matrix[METRICS].droplevel('week_number')
+    latest = values.index[-1]
+    previous = values.reindex([latest - pd.Timedelta(weeks=1)]).iloc[0]
+    current = values.iloc[-1].rename_axis('Metric').reset_index(name='value')
+    previous = previous.rename_axis('Metric').reset_index(name='value')
+    return compare_frames(current, previous)
+
+def run_batch(source, output, comparison_output=None, trends_output=None, workers=DEFAULT_MAX_WORKERS,
+              s3_workers=S3_MAX_WORKERS, store_path=None):
+    """Runs WBR ingestion over a local directory or an s3://bucket/prefix and returns the run summary."""
+    run_started = time.perf_counter()
+    summary = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'source': source,
+        'output': output,
+    }
+    recorder = instrumentation.activate(instrumentation.Recorder(f"wbr-batch-{summary['started_at']}"))
+    store = WBRMetricsStore(store_path) if store_path else None
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        with instrumentation.span('wbr.collect'):
+            pdf_files = list(collect_reports(source, spool_dir, s3_workers))
+        with instrumentation.span('wbr.extract_all'):
+            weekly_metrics = extract_all_metrics(pdf_files, max_workers=workers, store=store)
+    if store is not None:
+        store.close()
+
+    matrix, skipped = build_week_matrix(weekly_metrics)
+    write_table(matrix.reset_index(), output)
+
+    comparison = latest_comparison(matrix)
+    if comparison_output:
+        write_table(comparison, comparison_output)
+    if trends_output:
+        trends = weekly_trends(matrix)
+        trends.columns = [f"{metric} {measure}" for metric, measure in trends.columns]
+        write_table(trends.reset_index(), trends_output)
+
+    summary['files'] = len(pdf_files)
+    summary['store_hits'] = sum(1 for metrics in weekly_metrics if metrics.get('cached'))
+    summary['weeks'] = len(matrix)
+    summary['first_week'] = matrix.index[0][0].date().isoformat() if len(matrix) else None
+    summary['latest_week'] = matrix.index[-1][0].date().isoformat() if len(matrix) else None
+    summary['failures'] = [
+        {'file': metrics['source'], 'error': metrics['error']} for metrics in weekly_metrics if 'error' in metrics
+    ]
+    failed = {failure['file'] for failure in summary['failures']}
+    summary['no_week_range'] = [source for source in skipped if source not in failed]
+    summary['latest_comparison'] = comparison.astype(object).where(comparison.notna(), None).to_dict(orient='records')
+    summary['wall_seconds'] = round(time.perf_counter() - run_started, 4)
+    summary['counters'] = dict(recorder.counters)
+    recorder.flush()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract weekly business reports without the Streamlit UI.")
+    parser.add_argument('source', help="directory of WBR PDFs or s3://bucket/prefix")
+    parser.add_argument('--output', default='wbr_weeks.csv', help="week x metric table (.csv, .parquet or .xlsx)")
+    parser.add_argument('--comparison', help="latest week vs the week before, same formats")
+    parser.add_argument('--trends', help="WoW, rolling 4-week and YoY table, same formats")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help="extraction processes")
+    parser.add_argument('--s3-workers', type=int, default=S3_MAX_WORKERS, help="concurrent S3 downloads")
+    parser.add_argument('--store', nargs='?', const=DEFAULT_STORE_PATH,
+                        help="metrics store; reports already in it are not parsed again")
+    parser.add_argument('--summary', help="write the JSON run summary here instead of stdout")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        args.source,
+        args.output,
+        comparison_output=args.comparison,
+        trends_output=args.trends,
+        workers=args.workers,
+        s3_workers=args.s3_workers,
+        store_path=args.store,
+    )
+
+    if args.summary:
+        with open(args.summary, 'w') as summary_file:
+            json.dump(summary, summary_file, indent=2, default=str)
+    else:
+        json.dump(summary, sys.stdout, indent=2, default=str)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
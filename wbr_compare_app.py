@@ -20,112 +20,174 @@
    ],
    "source": [
     "import streamlit as st\n",
-    "import fitz  # PyMuPDF\n",
-    "import re\n",
     "import pandas as pd\n",
-    "from datetime import datetime\n",
-    "import io\n",
+    "import os\n",
+    "import shutil\n",
+    "import tempfile\n",
+    "import uuid\n",
+    "\n",
+    "import instrumentation\n",
+    "from wbr_metrics import (DEFAULT_MAX_WORKERS, METRICS, WBRMetricsStore, build_week_matrix, compare_weeks,\n",
+    "                         comparison_summary, extract_all_metrics, extract_metrics_from_pdf, file_hash, weekly_trends)\n",
     "\n",
     "st.set_page_config(page_title=\"WBR Comparison Tool\", layout=\"wide\")\n",
     "\n",
     "# ---------- PDF Extraction & Analysis Functions ----------\n",
     "\n",
-    "def extract_metrics_from_pdf(file_bytes, label=\"\"):\n",
-    "    doc = fitz.open(stream=io.BytesIO(file_bytes), filetype=\"pdf\")\n",
-    "    text = \" \".join(page.get_text() for page in doc)\n",
-    "    doc.close()\n",
-    "\n",
-    "    week_range = re.search(r'(\\d{4}-\\d{2}-\\d{2})\\s+Sta.*?(\\d{4}-\\d{2}-\\d{2})\\s+End', text)\n",
-    "    start_date = datetime.strptime(week_range.group(1), '%Y-%m-%d') if week_range else None\n",
-    "    week_number = start_date.isocalendar()[1] if start_date else None\n",
-    "\n",
-    "    metrics = {\n",
-    "        'source': label,\n",
-    "        'week_number': week_number,\n",
-    "        'start_date': start_date,\n",
-    "    }\n",
-    "\n",
-    "    labels = {\n",
-    "        'Total GDV': r'Subtotal\\s+\\$([0-9\\.]+)',\n",
-    "        'Publishes': r'Publishes\\s+\\$([0-9\\.-]+)',\n",
-    "        'Publishes to NAC2': r'Publishes to NAC2.*?\\$([0-9\\.-]+)',\n",
-    "        'Fundraiser Traffic': r'Fundraiser Traffic.*?\\$([0-9\\.-]+)',\n",
-    "        'Donation Intent': r'Donation Intent.*?\\$([0-9\\.-]+)',\n",
-    "        'Donation Yield': r'Donation Yield\\s+\\$([0-9\\.-]+)',\n",
-    "    }\n",
-    "\n",
-    "    for key, pattern in labels.items():\n",
-    "        match = re.search(pattern, text)\n",
-    "        metrics[key] = float(match.group(1)) if match else None\n",
-    "\n",
-    "    return metrics\n",
-    "\n",
-    "def generate_insight(metric, delta, pct):\n",
-    "    if pct is None:\n",
-    "        return \"Not enough data\"\n",
-    "    if \"GDV\" in metric:\n",
-    "        return \"↑ Stronger donation volume.\" if delta > 0 else \"↓ Possibly lower traffic or conversion.\"\n",
-    "    elif \"Publishes to NAC2\" in metric:\n",
-    "        return \"↑ Better conversion.\" if delta > 0 else \"↓ Conversion drop.\"\n",
-    "    elif \"Fundraiser Traffic\" in metric:\n",
-    "        return \"Traffic changes influenced performance.\"\n",
-    "    elif \"Donation Intent\" in metric:\n",
-    "        return \"Reflects donor sentiment.\"\n",
-    "    elif \"Donation Yield\" in metric:\n",
-    "        return \"Avg. donation amount changed.\"\n",
-    "    elif \"Publishes\" in metric:\n",
-    "        return \"↑ More fundraiser effort.\" if delta > 0 else \"↓ Less engagement.\"\n",
-    "    return \"Performance shifted.\"\n",
-    "\n",
-    "def compare_weeks(curr, prev):\n",
-    "    comparison = []\n",
-    "    for key in curr.keys():\n",
-    "        if key not in prev or not isinstance(curr[key], (float, int)):\n",
-    "            continue\n",
-    "        current = curr[key]\n",
-    "        previous = prev[key]\n",
-    "        delta = current - previous\n",
-    "        pct_change = (delta / previous * 100) if previous else None\n",
-    "        comparison.append({\n",
-    "            'Metric': key,\n",
-    "            'Current Week': round(current, 2),\n",
-    "            'Previous Week': round(previous, 2),\n",
-    "            'Change': round(delta, 2),\n",
-    "            'Percent Change (%)': round(pct_change, 2) if pct_change is not None else None,\n",
-    "            'Insight': generate_insight(key, delta, pct_change)\n",
-    "        })\n",
-    "    return pd.DataFrame(comparison)\n",
-    "\n",
-    "# ---------- Streamlit Interface ----------\n",
+    "@st.cache_resource\n",
+    "def get_metrics_store():\n",
+    "    \"\"\"One metrics store per server process, shared by every session.\"\"\"\n",
+    "    return WBRMetricsStore()\n",
+    "\n",
+    "def extract_metrics_from_upload(upload, label, store):\n",
+    "    \"\"\"Spools an uploaded PDF to a temp directory in chunks and extracts its metrics by path.\n",
+    "\n",
+    "    A file whose hash is already in the store is not parsed again. The file is\n",
+    "    closed before it is reopened by path, which Windows requires. The store\n",
+    "    records the upload's file name as the source; label only names the returned copy.\n",
+    "    \"\"\"\n",
+    "    with tempfile.TemporaryDirectory() as spool_dir:\n",
+    "        path = os.path.join(spool_dir, \"upload.pdf\")\n",
+    "        upload.seek(0)\n",
+    "        with open(path, \"wb\") as spooled:\n",
+    "            shutil.copyfileobj(upload, spooled, 1024 * 1024)\n",
+    "        digest = file_hash(path)\n",
+    "        stored = store.get(digest)\n",
+    "        if stored is not None:\n",
+    "            instrumentation.count('wbr.store_hits')\n",
+    "            return dict(stored, source=label)\n",
+    "        metrics = extract_metrics_from_pdf(path, upload.name)\n",
+    "    store.put(digest, metrics)\n",
+    "    return dict(metrics, source=label)\n",
+    "\n",
+    "def extract_weeks_from_uploads(uploads, max_workers, store):\n",
+    "    \"\"\"Spools every upload to a temp directory and extracts the ones not yet stored across a process pool.\"\"\"\n",
+    "    with tempfile.TemporaryDirectory() as spool_dir:\n",
+    "        pdf_files = []\n",
+    "        for i, upload in enumerate(uploads):\n",
+    "            path = os.path.join(spool_dir, f\"{i:04d}.pdf\")\n",
+    "            upload.seek(0)\n",
+    "            with open(path, \"wb\") as spooled:\n",
+    "                shutil.copyfileobj(upload, spooled, 1024 * 1024)\n",
+    "            pdf_files.append((upload.name, path))\n",
+    "        return extract_all_metrics(pdf_files, max_workers=max_workers, store=store)\n",
+    "\n",
+    "def render_comparison(comparison_df):\n",
+    "    st.subheader(\"🔍 Summary & Insights\")\n",
+    "    st.markdown(\"\\n\\n\".join(comparison_summary(comparison_df)))\n",
     "\n",
-    "st.title(\"📊 Weekly Business Report Comparison Tool\")\n",
+    "    st.subheader(\"📋 Full Comparison Table\")\n",
+    "    st.dataframe(comparison_df, use_container_width=True)\n",
     "\n",
-    "col1, col2 = st.columns(2)\n",
+    "    csv = comparison_df.to_csv(index=False).encode('utf-8')\n",
+    "    st.download_button(\"📤 Download CSV Summary\", csv, \"wbr_comparison.csv\", \"text/csv\")\n",
     "\n",
-    "with col1:\n",
-    "    curr_file = st.file_uploader(\"📥 Upload Current Week PDF\", type=\"pdf\", key=\"curr\")\n",
+    "def render_trends(matrix, trends):\n",
+    "    st.subheader(\"📅 Week × Metric Matrix\")\n",
+    "    st.dataframe(matrix, use_container_width=True)\n",
     "\n",
-    "with col2:\n",
-    "    prev_file = st.file_uploader(\"📥 Upload Previous Week PDF\", type=\"pdf\", key=\"prev\")\n",
+    "    st.subheader(\"📈 Trends\")\n",
+    "    metric = st.selectbox(\"Metric\", METRICS)\n",
+    "    metric_trends = trends[metric]\n",
+    "    chart_columns = [column for column in metric_trends.columns if column.startswith(('value', 'rolling'))]\n",
+    "    st.line_chart(metric_trends[chart_columns].droplevel('week_number'))\n",
+    "    st.dataframe(metric_trends, use_container_width=True)\n",
     "\n",
-    "if curr_file and prev_file:\n",
-    "    with st.spinner(\"Extracting and comparing metrics...\"):\n",
-    "        curr_metrics = extract_metrics_from_pdf(curr_file.read(), \"Current Week\")\n",
-    "        prev_metrics = extract_metrics_from_pdf(prev_file.read(), \"Previous Week\")\n",
-    "        comparison_df = compare_weeks(curr_metrics, prev_metrics)\n",
+    "    flat_trends = trends.copy()\n",
+    "    flat_trends.columns = [f\"{metric} {measure}\" for metric, measure in flat_trends.columns]\n",
+    "    csv = flat_trends.reset_index().to_csv(index=False).encode('utf-8')\n",
+    "    st.download_button(\"📤 Download Trend CSV\", csv, \"wbr_trends.csv\", \"text/csv\")\n",
     "\n",
-    "    st.subheader(\"🔍 Summary & Insights\")\n",
-    "    for _, row in comparison_df.iterrows():\n",
-    "        arrow = \"🔺\" if row[\"Change\"] > 0 else \"🔻\"\n",
-    "        st.markdown(f\"**{arrow} {row['Metric']}**: {row['Current Week']} ({row['Percent Change (%)']}%) — _{row['Insight']}_\")\n",
+    "# ---------- Streamlit Interface ----------\n",
     "\n",
-    "    st.subheader(\"📋 Full Comparison Table\")\n",
-    "    st.dataframe(comparison_df, use_container_width=True)\n",
+    "st.title(\"📊 Weekly Business Report Comparison Tool\")\n",
     "\n",
-    "    csv = comparison_df.to_csv(index=False).encode('utf-8')\n",
-    "    st.download_button(\"📤 Download CSV Summary\", csv, \"wbr_comparison.csv\", \"text/csv\")\n",
+    "if 'recorder' not in st.session_state:\n",
+    "    st.session_state['recorder'] = instrumentation.Recorder(f\"wbr-app-{uuid.uuid4().hex[:8]}\")\n",
+    "recorder = instrumentation.activate(st.session_state['recorder'])\n",
+    "store = get_metrics_store()\n",
+    "\n",
+    "mode = st.radio(\"Mode\", (\"Compare two weeks\", \"Multi-week trend\", \"Stored weeks\"), horizontal=True)\n",
+    "\n",
+    "if mode == \"Compare two weeks\":\n",
+    "    col1, col2 = st.columns(2)\n",
+    "\n",
+    "    with col1:\n",
+    "        curr_file = st.file_uploader(\"📥 Upload Current Week PDF\", type=\"pdf\", key=\"curr\")\n",
+    "\n",
+    "    with col2:\n",
+    "        prev_file = st.file_uploader(\"📥 Upload Previous Week PDF\", type=\"pdf\", key=\"prev\")\n",
+    "\n",
+    "    if curr_file and prev_file:\n",
+    "        with st.spinner(\"Extracting and comparing metrics...\"):\n",
+    "            curr_metrics = extract_metrics_from_upload(curr_file, \"Current Week\", store)\n",
+    "            prev_metrics = extract_metrics_from_upload(prev_file, \"Previous Week\", store)\n",
+    "            with instrumentation.span('wbr.compare_weeks'):\n",
+    "                comparison_df = compare_weeks(curr_metrics, prev_metrics)\n",
+    "\n",
+    "        render_comparison(comparison_df)\n",
+    "    else:\n",
+    "        st.info(\"Upload both PDFs to start the comparison.\")\n",
+    "elif mode == \"Multi-week trend\":\n",
+    "    week_files = st.file_uploader(\"📥 Upload weekly WBR PDFs\", type=\"pdf\", accept_multiple_files=True, key=\"weeks\")\n",
+    "    max_workers = st.sidebar.number_input(\"Parallel extraction workers\", min_value=1, value=DEFAULT_MAX_WORKERS, step=1)\n",
+    "\n",
+    "    if week_files:\n",
+    "        # Extract once per set of uploads; picking another metric reruns the script.\n",
+    "        weeks_key = tuple(upload.file_id for upload in week_files)\n",
+    "        if st.session_state.get('wbr_weeks', {}).get('key') != weeks_key:\n",
+    "            with st.spinner(f\"Extracting {len(week_files)} weekly reports...\"):\n",
+    "                weekly_metrics = extract_weeks_from_uploads(week_files, max_workers, store)\n",
+    "                matrix, skipped = build_week_matrix(weekly_metrics)\n",
+    "                with instrumentation.span('wbr.weekly_trends'):\n",
+    "                    trends = weekly_trends(matrix)\n",
+    "            known = sum(1 for metrics in weekly_metrics if metrics.get('cached'))\n",
+    "            st.session_state['wbr_weeks'] = {\n",
+    "                'key': weeks_key, 'matrix': matrix, 'skipped': skipped, 'trends': trends, 'known': known,\n",
+    "            }\n",
+    "        weeks = st.session_state['wbr_weeks']\n",
+    "        matrix, skipped, trends = weeks['matrix'], weeks['skipped'], weeks['trends']\n",
+    "\n",
+    "        if weeks['known']:\n",
+    "            st.info(f\"{weeks['known']} of {len(week_files)} reports were already in the metrics store and were not parsed again.\")\n",
+    "        for source in skipped:\n",
+    "            st.warning(f\"{source} could not be read or has no week range; it was left out of the trend.\")\n",
+    "\n",
+    "        if not matrix.empty:\n",
+    "            render_trends(matrix, trends)\n",
+    "    else:\n",
+    "        st.info(\"Upload weekly WBR PDFs to build the trend.\")\n",
     "else:\n",
-    "    st.info(\"Upload both PDFs to start the comparison.\")\n"
+    "    stored_weeks = store.weeks()\n",
+    "    if stored_weeks.empty:\n",
+    "        st.info(\"No weeks stored yet. Weeks are saved here whenever a report is uploaded.\")\n",
+    "    else:\n",
+    "        week_labels = [\n",
+    "            f\"{row.start_date:%Y-%m-%d} (week {row.week_number})\" for row in stored_weeks.itertuples()\n",
+    "        ]\n",
+    "        st.subheader(\"🔁 Compare Two Stored Weeks\")\n",
+    "        col1, col2 = st.columns(2)\n",
+    "        curr_index = col1.selectbox(\"Current week\", range(len(week_labels)), format_func=week_labels.__getitem__)\n",
+    "        prev_index = col2.selectbox(\"Previous week\", range(len(week_labels)), format_func=week_labels.__getitem__,\n",
+    "                                    index=min(1, len(week_labels) - 1))\n",
+    "        curr_metrics = store.get(stored_weeks['file_hash'].iloc[curr_index])\n",
+    "        prev_metrics = store.get(stored_weeks['file_hash'].iloc[prev_index])\n",
+    "        with instrumentation.span('wbr.compare_weeks'):\n",
+    "            comparison_df = compare_weeks(curr_metrics, prev_metrics)\n",
+    "        render_comparison(comparison_df)\n",
+    "\n",
+    "        st.subheader(\"📆 Stored Range\")\n",
+    "        first, last = stored_weeks['start_date'].min().date(), stored_weeks['start_date'].max().date()\n",
+    "        date_range = st.date_input(\"Weeks starting between\", value=(first, last), min_value=first, max_value=last)\n",
+    "        if len(date_range) == 2:\n",
+    "            matrix, _ = build_week_matrix(store.load_range(*date_range))\n",
+    "            if not matrix.empty:\n",
+    "                with instrumentation.span('wbr.weekly_trends'):\n",
+    "                    trends = weekly_trends(matrix)\n",
+    "                render_trends(matrix, trends)\n",
+    "\n",
+    "instrumentation.render_sidebar(recorder)\n",
+    "recorder.flush()\n"
    ]
   },
   {
@@ -0,0 +1,412 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import fitz  # PyMuPDF
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# WBR metric extraction and multi-week trends. Kept out of
+# wbr_compare_app.py so pool workers can import it without starting the
+# Streamlit app.
+
+# ---------- Constants ----------
+
+# Label as printed in the report -> metric name. Labels in ADJACENT_LABELS
+# take their value only when nothing but whitespace separates the two; the
+# others take the next value on the same page.
+METRIC_LABELS = {
+    'Subtotal': 'Total GDV',
+    'Publishes to NAC2': 'Publishes to NAC2',
+    'Publishes': 'Publishes',
+    'Fundraiser Traffic': 'Fundraiser Traffic',
+    'Donation Intent': 'Donation Intent',
+    'Donation Yield': 'Donation Yield',
+}
+ADJACENT_LABELS = {'Subtotal', 'Publishes', 'Donation Yield'}
+METRICS = ['Total GDV', 'Publishes', 'Publishes to NAC2', 'Fundraiser Traffic', 'Donation Intent', 'Donation Yield']
+
+# One token pattern: a week start date, a metric label or a dollar value.
+# Every alternative is a literal or a simple character run with no nested
+# quantifiers, so finditer scans each page in linear time, found or not.
+# Longer labels come first so 'Publishes to NAC2' is not read as 'Publishes'.
+TOKEN_PATTERN = re.compile(
+    r'(?P<start>\d{4}-\d{2}-\d{2})[ \t\r\n]+Sta'
+    r'|(?P<label>' + '|'.join(re.escape(label) for label in sorted(METRIC_LABELS, key=len, reverse=True)) + r')'
+    r'|\$[ \t]*(?P<value>-?[0-9][0-9,]*(?:\.[0-9]+)?)'
+)
+
+# Insight per metric, first matching name fragment wins:
+# (fragment, insight when up, insight when flat or down).
+INSIGHT_RULES = [
+    ('GDV', "↑ Stronger donation volume.", "↓ Possibly lower traffic or conversion."),
+    ('Publishes to NAC2', "↑ Better conversion.", "↓ Conversion drop."),
+    ('Fundraiser Traffic', "Traffic changes influenced performance.", "Traffic changes influenced performance."),
+    ('Donation Intent', "Reflects donor sentiment.", "Reflects donor sentiment."),
+    ('Donation Yield', "Avg. donation amount changed.", "Avg. donation amount changed."),
+    ('Publishes', "↑ More fundraiser effort.", "↓ Less engagement."),
+]
+DEFAULT_INSIGHT = "Performance shifted."
+NO_DATA_INSIGHT = "Not enough data"
+COMPARISON_COLUMNS = ['Current Week', 'Previous Week', 'Change', 'Percent Change (%)', 'Insight']
+
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+ROLLING_WEEKS = 4
+DEFAULT_STORE_PATH = os.getenv('WBR_STORE_PATH', 'wbr_metrics.sqlite')
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# ---------- Extraction ----------
+
+def scan_metrics(pages):
+    """Pulls the week start date and every labelled metric out of the page texts in one pass.
+
+    A label takes the next dollar value on its own page, unless another label
+    comes first; the first occurrence of each metric wins, and scanning stops
+    once every metric and the start date are found. Returns
+    (start_date string or None, {metric: float or None}).
+    """
+    start_date = None
+    values = dict.fromkeys(METRICS)
+    missing = len(METRICS)
+    for text in pages:
+        pending = None
+        for token in TOKEN_PATTERN.finditer(text):
+            if token.lastgroup == 'start':
+                start_date = start_date or token.group('start')
+            elif token.lastgroup == 'label':
+                pending = token
+            elif pending is not None:
+                label = pending.group('label')
+                metric = METRIC_LABELS[label]
+                adjacent = not text[pending.end():token.start()].strip()
+                if values[metric] is None and (adjacent or label not in ADJACENT_LABELS):
+                    values[metric] = float(token.group('value').replace(',', ''))
+                    missing -= 1
+                pending = None
+            if not missing and start_date:
+                return start_date, values
+    return start_date, values
+
+@instrumentation.traced('wbr.extract_metrics')
+def extract_metrics_from_pdf(file_bytes, label=""):
+    # file_bytes may also be a path, which MuPDF opens without loading the whole file.
+    if isinstance(file_bytes, (str, os.PathLike)):
+        doc = fitz.open(file_bytes, filetype="pdf")
+        instrumentation.count('wbr.bytes_read', os.path.getsize(file_bytes))
+    else:
+        doc = fitz.open(stream=io.BytesIO(file_bytes), filetype="pdf")
+        instrumentation.count('wbr.bytes_read', len(file_bytes))
+    start, values = scan_metrics(page.get_text() for page in doc)
+    instrumentation.count('wbr.pages_parsed', doc.page_count)
+    doc.close()
+
+    start_date = datetime.strptime(start, '%Y-%m-%d') if start else None
+    week_number = start_date.isocalendar()[1] if start_date else None
+
+    metrics = {
+        'source': label,
+        'week_number': week_number,
+        'start_date': start_date,
+    }
+    metrics.update(values)
+    return metrics
+
+def _extract_timed(pdf, label):
+    started = time.perf_counter()
+    metrics = extract_metrics_from_pdf(pdf, label)
+    return metrics, time.perf_counter() - started
+
+def extract_all_metrics(pdf_files, max_workers=DEFAULT_MAX_WORKERS, store=None):
+    """Extracts metrics from (label, pdf) pairs across a process pool and returns them in input order.
+
+    pdf is a path or bytes; pass paths so only the path is sent to a worker.
+    With a WBRMetricsStore, files whose hash is already stored are answered
+    from it (marked 'cached': True) and new results are saved. A PDF that
+    cannot be read yields {'source': label, 'error': message}.
+    """
+    pdf_files = list(pdf_files)
+    results = [None] * len(pdf_files)
+    misses = []
+    for i, (label, pdf) in enumerate(pdf_files):
+        digest = file_hash(pdf) if store is not None else None
+        stored = store.get(digest) if store is not None else None
+        if stored is not None:
+            instrumentation.count('wbr.store_hits')
+            results[i] = dict(stored, source=label, cached=True)
+        else:
+            misses.append((i, label, pdf, digest))
+
+    if max_workers <= 1 or len(misses) <= 1:
+        executor = None
+    else:
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=min(max_workers, len(misses)), mp_context=context)
+
+    try:
+        if executor is None:
+            futures = None
+        else:
+            futures = [executor.submit(_extract_timed, pdf, label) for _, label, pdf, _ in misses]
+        for n, (i, label, pdf, digest) in enumerate(misses):
+            try:
+                metrics, seconds = _extract_timed(pdf, label) if futures is None else futures[n].result()
+            except Exception as e:
+                results[i] = {'source': label, 'error': str(e)}
+                continue
+            if futures is not None:
+                # Timed in the worker, so recorded here against the caller's recorder.
+                instrumentation.observe('wbr.extract_metrics', seconds)
+            if store is not None:
+                store.put(digest, metrics)
+            results[i] = metrics
+        return results
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+# ---------- Metrics Store ----------
+
+def file_hash(pdf):
+    """Returns the sha256 of a PDF given as bytes or a path, reading a path in chunks."""
+    digest = hashlib.sha256()
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, 'rb') as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    else:
+        digest.update(pdf)
+    return digest.hexdigest()
+
+class WBRMetricsStore:
+    """SQLite store of extracted WBR metrics, one report per file hash.
+
+    Reports are indexed by start_date and week_number so any week, pair of
+    weeks or date range can be read back without opening a PDF. Metric values
+    are kept one row per (report, metric), so new metrics need no migration.
+    The connection may be shared across sessions, so every statement and its
+    commit run under a lock.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS wbr_reports (
+                file_hash TEXT PRIMARY KEY,
+                source TEXT,
+                week_number INTEGER,
+                start_date TEXT,
+                extracted_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS wbr_reports_week ON wbr_reports (start_date, week_number);
+            CREATE TABLE IF NOT EXISTS wbr_metric_values (
+                file_hash TEXT NOT NULL REFERENCES wbr_reports (file_hash),
+                metric TEXT NOT NULL,
+                value REAL,
+                PRIMARY KEY (file_hash, metric)
+            );
+        """)
+        self.conn.commit()
+
+    def __contains__(self, digest):
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM wbr_reports WHERE file_hash = ?", (digest,)).fetchone()
+        return row is not None
+
+    def get(self, digest):
+        """Returns the stored metrics dict for a file hash, or None."""
+        reports = self._load("WHERE r.file_hash = ?", (digest,))
+        return reports[0] if reports else None
+
+    def put(self, digest, metrics):
+        start_date = metrics.get('start_date')
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO wbr_reports VALUES (?, ?, ?, ?, ?)",
+                (digest, metrics.get('source'), metrics.get('week_number'),
+                 start_date.strftime('%Y-%m-%d') if start_date else None, time.time()),
+            )
+            self.conn.execute("DELETE FROM wbr_metric_values WHERE file_hash = ?", (digest,))
+            self.conn.executemany(
+                "INSERT INTO wbr_metric_values VALUES (?, ?, ?)",
+                [(digest, metric, metrics.get(metric)) for metric in METRICS],
+            )
+
+    def weeks(self):
+        """Returns the stored weeks, newest first: one row per start_date, from its latest report."""
+        with self._lock:
+            return pd.read_sql("""
+                SELECT start_date, week_number, source, file_hash FROM wbr_reports r
+                WHERE start_date IS NOT NULL AND extracted_at = (
+                    SELECT MAX(extracted_at) FROM wbr_reports WHERE start_date = r.start_date
+                )
+                ORDER BY start_date DESC
+            """, self.conn, parse_dates=['start_date'])
+
+    def load_range(self, start=None, end=None):
+        """Returns the metrics dicts of every stored week with start <= start_date <= end, oldest report first."""
+        clauses, params = ["r.start_date IS NOT NULL"], []
+        if start is not None:
+            clauses.append("r.start_date >= ?")
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        if end is not None:
+            clauses.append("r.start_date <= ?")
+            params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+        return self._load("WHERE " + " AND ".join(clauses), params)
+
+    def _load(self, where, params):
+        with self._lock:
+            rows = self.conn.execute(f"""
+                SELECT r.file_hash, r.source, r.week_number, r.start_date, v.metric, v.value
+                FROM wbr_reports r LEFT JOIN wbr_metric_values v ON v.file_hash = r.file_hash
+                {where}
+                ORDER BY r.extracted_at, r.file_hash
+            """, params).fetchall()
+        reports = {}
+        for digest, source, week_number, start_date, metric, value in rows:
+            if digest not in reports:
+                reports[digest] = {
+                    'source': source,
+                    'week_number': week_number,
+                    'start_date': datetime.strptime(start_date, '%Y-%m-%d') if start_date else None,
+                    **dict.fromkeys(METRICS),
+                }
+            if metric is not None:
+                reports[digest][metric] = value
+        return list(reports.values())
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+# ---------- Week Comparison ----------
+
+def classify_insights(metric, change, pct_change):
+    """Returns the insight for every row as one column operation per rule."""
+    metric = pd.Series(metric).astype(str).reset_index(drop=True)
+    up = np.asarray(change) > 0
+    conditions, choices = [np.asarray(pd.isna(pct_change))], [NO_DATA_INSIGHT]
+    for fragment, when_up, when_down in INSIGHT_RULES:
+        conditions.append(metric.str.contains(fragment, regex=False).to_numpy())
+        choices.append(np.where(up, when_up, when_down))
+    return np.select(conditions, choices, default=DEFAULT_INSIGHT)
+
+def compare_frames(current, previous, keys=('Metric',), value='value'):
+    """Compares two long metric frames row for row, aligned on the key columns.
+
+    current and previous hold one row per metric (and per segment, e.g.
+    keys=('Region', 'Campaign', 'Metric')). Every current row is kept; a
+    missing previous value, or a previous value of zero, gives NaN change
+    percentages and a 'Not enough data' insight. All steps are column
+    operations, so hundreds of metrics across many segments compare at once.
+    """
+    keys = list(keys)
+    aligned = current[keys + [value]].merge(
+        previous[keys + [value]], on=keys, how='left', suffixes=('_current', '_previous'), validate='one_to_one'
+    )
+    curr_values = aligned[f'{value}_current'].astype('float64')
+    prev_values = aligned[f'{value}_previous'].astype('float64')
+    change = curr_values - prev_values
+    pct_change = (change / prev_values * 100).where(prev_values != 0)
+
+    comparison = aligned[keys].copy()
+    comparison['Current Week'] = curr_values.round(2)
+    comparison['Previous Week'] = prev_values.round(2)
+    comparison['Change'] = change.round(2)
+    comparison['Percent Change (%)'] = pct_change.round(2)
+    comparison['Insight'] = classify_insights(aligned['Metric'] if 'Metric' in keys else aligned[keys[-1]],
+                                              change, pct_change)
+    return comparison
+
+def metrics_to_frame(metrics):
+    """Turns an extracted metrics dict into a long (Metric, value) frame of its numeric entries."""
+    rows = [
+        (key, value) for key, value in metrics.items()
+        if isinstance(value, (float, int)) and not isinstance(value, bool)
+    ]
+    return pd.DataFrame(rows, columns=['Metric', 'value'])
+
+def compare_weeks(curr, prev):
+    """Compares two extracted metrics dicts; metrics missing from prev are left out."""
+    current = metrics_to_frame(curr)
+    previous = metrics_to_frame(prev)
+    return compare_frames(current[current['Metric'].isin(prev.keys())], previous).reset_index(drop=True)
+
+def comparison_summary(comparison, keys=('Metric',)):
+    """Builds the markdown summary line for every comparison row without iterating rows."""
+    keys = list(keys)
+    label = _as_text(comparison[keys[0]])
+    for key in keys[1:]:
+        label = label + " · " + _as_text(comparison[key])
+    arrow = pd.Series(np.where(comparison['Change'] > 0, "🔺", "🔻"), index=comparison.index)
+    return (
+        "**" + arrow + " " + label + "**: " + _as_text(comparison['Current Week'])
+        + " (" + _as_text(comparison['Percent Change (%)']) + "%) — _" + _as_text(comparison['Insight']) + "_"
+    )
+
+def _as_text(column):
+    # numpy formats missing values as 'nan'; Series.astype(str) would keep them missing.
+    return pd.Series(column.to_numpy().astype(str), index=column.index)
+
+# ---------- Multi-Week Trends ----------
+
+def build_week_matrix(metrics_list):
+    """Builds the week x metric matrix from extracted metrics, indexed by
+    (start_date, week_number) in date order.
+
+    Returns (matrix, skipped): reports without a readable week range cannot be
+    placed and are listed in skipped; if two reports cover the same week, the
+    later one in metrics_list wins.
+    """
+    rows = [m for m in metrics_list if m.get('start_date') is not None and 'error' not in m]
+    skipped = [m.get('source', '') for m in metrics_list if m.get('start_date') is None or 'error' in m]
+    columns = ['start_date', 'week_number', 'source'] + METRICS
+    matrix = pd.DataFrame(rows, columns=columns)
+    matrix['start_date'] = pd.to_datetime(matrix['start_date'])
+    matrix[METRICS] = matrix[METRICS].astype('float64')
+    matrix = (
+        matrix.drop_duplicates('start_date', keep='last')
+        .sort_values('start_date')
+        .set_index(['start_date', 'week_number'])
+    )
+    return matrix, skipped
+
+def _pct_change(current, base):
+    pct = (current - base) / base.abs() * 100
+    return pct.where(base != 0)
+
+def weekly_trends(matrix, rolling_weeks=ROLLING_WEEKS):
+    """Computes WoW, rolling average and YoY for every metric of a week matrix in one pass.
+
+    Prior weeks are looked up by date (7 and 364 days back) rather than by
+    row position, so a missing week gives NaN instead of comparing against
+    the wrong week. Percent changes against a zero or missing base are NaN.
+    Returns a frame with (metric, measure) columns on the matrix's index.
+    """
+    values = matrix[METRICS].droplevel('week_number')
+    dates = values.index
+    previous = values.reindex(dates - pd.Timedelta(weeks=1)).set_axis(dates)
+    last_year = values.reindex(dates - pd.Timedelta(weeks=52)).set_axis(dates)
+    rolling = values.rolling(f'{7 * rolling_weeks}D').mean()
+
+    measures = {
+        'value': values,
+        'wow_change': values - previous,
+        'wow_pct': _pct_change(values, previous),
+        f'rolling_{rolling_weeks}wk_avg': rolling,
+        'yoy_change': values - last_year,
+        'yoy_pct': _pct_change(values, last_year),
+    }
+    trends = pd.concat(measures, axis=1).swaplevel(axis=1)
+    trends = trends.reindex(columns=pd.MultiIndex.from_product([METRICS, list(measures)]))
+    trends.index = matrix.index
+    return trends.round(2)